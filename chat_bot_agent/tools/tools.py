@@ -2,12 +2,12 @@
 
 from google.adk.tools.tool_context import ToolContext
 from typing import Optional, List
-import json
 from google.adk.tools.tool_context import ToolContext
 import httpx
 from google.adk.tools.tool_context import ToolContext
 from google.adk.tools.base_tool import BaseTool
 from typing import Dict, Any
+from models.codec import json_body, loads
 
 
 client = httpx.AsyncClient(base_url= "http://127.0.0.1:7999", 
@@ -53,8 +53,8 @@ async def toll_for_calling_task_manager(tool_context: ToolContext, params: dict,
               index_of_pipeline = params["index_of_pipeline"]
               json_data["candidates"] = {"candidates" : tool_context.state["сandidates"][index_of_pipeline]}
         try:      
-           responce = await client.post("/create_tasks", params=params, json={"data": json_data})
-           return {"Status": f"OK", "params: " : params, "json_data: ": json_data, "responce_from_server": responce.json()}
+           responce = await client.post("/create_tasks", params=params, **json_body({"data": json_data}))
+           return {"Status": f"OK", "params: " : params, "json_data: ": json_data, "responce_from_server": loads(responce.content)}
 
         except Exception as e:
          return {"Status": f"Error : {e}", "params: " : params, "json_data: ": json_data}
@@ -69,7 +69,7 @@ async def tool_for_killing_voice_bot_task(params: dict):
         """ 
         try:      
            responce = await client.post("/kill_voice_bot_task", params=params)
-           return {"Status": f"OK", "params: " : params, "responce_from_server": responce.json()}
+           return {"Status": f"OK", "params: " : params, "responce_from_server": loads(responce.content)}
 
         except Exception as e:
          return {"Status": f"Error : {e}", "params: " : params}
@@ -112,7 +112,7 @@ def put_pipeline_in_state(tool_context: ToolContext, pipeline: str):
         else:
             index_generated = "0"
 
-        pipelines[index_generated] = json.loads(pipeline)
+        pipelines[index_generated] = loads(pipeline)
         candidates_truncated[index_generated] = []
         candidates_screened[index_generated] = []
         сandidates[index_generated] = []
@@ -129,10 +129,10 @@ def put_pipeline_in_state(tool_context: ToolContext, pipeline: str):
           with httpx.Client(timeout=1.0) as client:
             client.post(
                 "http://localhost:8765/broadcast",
-                json={
+                **json_body({
                     "index": index_generated,
                     "pipeline": pipelines[index_generated]
-                }
+                })
             )
         except Exception as e:
          print(f"WebSocket broadcast failed: {e}")
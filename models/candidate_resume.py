@@ -31,4 +31,19 @@ class Resume(BaseModel):
     work_experience: List[PositionDescription] = Field(..., description="List of positions in which the candidate worked")
     education: List[EducationInfo] = Field(..., description="List of educational information")
 
-    revision_date: Optional[str] = Field(None, description="Date of last profile update")
\ No newline at end of file
+    revision_date: Optional[str] = Field(None, description="Date of last profile update")
+
+# Резюме в том виде, в каком оно уходит в LLM для матчинга: только значимые поля под короткими ключами
+class ProjectedResume(BaseModel):
+    id: int = Field(..., description="Unique ID of the resume in ATS")
+    h: Optional[str] = Field(None, description="Headline, e.g. 'Senior Data Scientist at Yandex'")
+    loc: Optional[str] = Field(None, description="City and country of the candidate")
+    s: Optional[str] = Field(None, description="Summary, possibly truncated with '…'")
+    sk: Optional[List[str]] = Field(None, description="Skills")
+    lang: Optional[List[str]] = Field(None, description="Languages with level")
+    exp: Optional[List[str]] = Field(None, description="Work experience, one 'title @ company (start–end)' per position")
+    edu: Optional[List[str]] = Field(None, description="Education, one 'degree, institution (end year)' per entry")
+
+# Описание коротких ключей для инструкций агентов матчинга: берётся из самой схемы, чтобы не расходиться с ней
+PROJECTED_RESUME_LEGEND = "; ".join(f'"{name}" - {field.description}'
+                                    for name, field in ProjectedResume.model_fields.items() if name != "id")
@@ -0,0 +1,52 @@
+import json
+from functools import lru_cache
+from typing import Any, List, Union
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from .candidate_resume import Resume
+
+# Общий JSON-кодек для всех сервисов: orjson, если установлен, иначе стандартный json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_str(value: Any) -> str:
+    """For text WebSocket frames and SSE."""
+    return dumps(value).decode("utf-8")
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+def json_body(value: Any) -> dict:
+    """httpx request kwargs: client.post(url, **json_body(data)) instead of json=data."""
+    return {"content": dumps(value), "headers": {"Content-Type": "application/json"}}
+
+
+@lru_cache(maxsize=None)
+def adapter(type_) -> TypeAdapter:
+    # TypeAdapter строит валидатор один раз на тип, а не на каждый запрос
+    return TypeAdapter(type_)
+
+
+def validate_resumes(data: Union[bytes, str]) -> List[Resume]:
+    """Parses and validates a JSON array of resumes in one pass of pydantic-core."""
+    return adapter(List[Resume]).validate_json(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """default_response_class for the FastAPI services."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,81 @@
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import List
+from pydantic import TypeAdapter
+from .candidate_resume import Resume
+from . import codec
+
+DEFAULT_FILE = Path(__file__).resolve().parents[1] / "services" / "atsservice" / "ats_server" / "new_can.json"
+
+
+def measure(function, repeat: int) -> float:
+    """Best of three runs, microseconds per call."""
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        best = min(best, (time.perf_counter() - started) / repeat)
+    return best * 1e6
+
+
+def hops(resumes: list[dict], clients: int):
+    """(hop, before, after) pairs: the stdlib json and pydantic path and the models.codec path."""
+    lines = [json.dumps(resume, ensure_ascii=False) for resume in resumes]
+    body = json.dumps(resumes, ensure_ascii=False).encode("utf-8")
+    prompt = {"desired_resume": "python developer", "list_of_candidates": resumes}
+    payload = {"user_id": "0", "session_id": "0", "type_of_component": "ai_matching", "partial": True,
+               "candidates": [{"result": resumes}], "state_changes": {"RUNNING": True}}
+    payload_text = json.dumps(payload)
+    broadcast = {"type": "candidates_found", "candidates": resumes, "count": len(resumes)}
+    # FastAPI тоже строит валидатор тела один раз, поэтому и в "до" он готовый
+    dicts, resume_list = TypeAdapter(list[dict]), TypeAdapter(List[Resume])
+
+    return [
+        ("ATS page -> /add_candidates body",
+         lambda: json.dumps([json.loads(line) for line in lines]).encode("utf-8"),
+         lambda: ("[" + ",".join(lines) + "]").encode("utf-8")),
+        ("/add_candidates body -> list[dict]",
+         lambda: dicts.validate_python(json.loads(body)),
+         lambda: codec.loads(body)),
+        ("agent prompt text",
+         lambda: json.dumps(prompt),
+         lambda: codec.dumps_str(prompt)),
+        ("task manager -> agent WebSocket",
+         lambda: json.loads(json.dumps(payload)),
+         lambda: codec.loads(codec.dumps_str(payload))),
+        (f"Streamlit broadcast to {clients} clients",
+         lambda: [json.dumps(broadcast) for _ in range(clients)],
+         lambda: codec.dumps_str(broadcast)),
+        ("/call_webhook body -> List[Resume]",
+         lambda: resume_list.validate_python(json.loads(body)),
+         lambda: codec.validate_resumes(body)),
+        ("agent answer parse",
+         lambda: json.loads(payload_text),
+         lambda: codec.loads(payload_text)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-hop JSON cost: stdlib json and pydantic vs models.codec")
+    parser.add_argument("--file", default=str(DEFAULT_FILE), help="JSON with list_of_resumes")
+    parser.add_argument("--count", type=int, default=100, help="resumes per payload")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--clients", type=int, default=3, help="Streamlit WebSocket clients")
+    args = parser.parse_args()
+
+    with open(args.file, encoding="utf-8") as f:
+        pool = json.load(f)["list_of_resumes"]
+    resumes = [pool[i % len(pool)] for i in range(args.count)]
+
+    print(f"orjson: {'yes' if codec.orjson is not None else 'no'}, {args.count} resumes per payload")
+    print(f"{'hop':<40}{'before, us':>12}{'after, us':>12}{'x':>8}")
+    for name, before, after in hops(resumes, args.clients):
+        before_us, after_us = measure(before, args.repeat), measure(after, args.repeat)
+        print(f"{name:<40}{before_us:>12.1f}{after_us:>12.1f}{before_us / after_us:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
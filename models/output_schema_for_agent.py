@@ -1,7 +1,15 @@
 from typing import List
 from pydantic import BaseModel, Field
 from typing import Optional
-from .candidate_resume import Resume
+from .candidate_resume import ProjectedResume
 
 class output_schema(BaseModel):
-    list_of_candidates: Optional[List[Resume]] = Field(None, description="List of resumes, that matches the desired one")
\ No newline at end of file
+    list_of_candidates: Optional[List[ProjectedResume]] = Field(None, description="List of resumes, that matches the desired one")
+
+class CandidateMatch(BaseModel):
+    id: int = Field(..., description="ID of the matching resume, exactly as in the input")
+    score: Optional[int] = Field(None, description="Relevance to the desired resume from 0 to 100")
+    reason: Optional[str] = Field(None, description="Why the resume fits, at most 15 words")
+
+class match_ids_output_schema(BaseModel):
+    matches: Optional[List[CandidateMatch]] = Field(None, description="Resumes that match the desired one, best first")
@@ -3,6 +3,7 @@ import os
 import uvicorn
 from google.adk.sessions import InMemorySessionService
 import time
+from collections import OrderedDict
 from google.adk.events import Event, EventActions
 from typing import Any, Dict
 from fastapi import FastAPI
@@ -11,14 +12,28 @@ from google.adk.runners import Runner
 from chat_bot_agent.agent import root_agent
 from .process_responces import process_agent_response
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from models.codec import FastJSONResponse, loads
 
 
 session_service = InMemorySessionService()
 
 APP_NAME = "agents"
 
+# request_id последних обновлений от Task Manager
+SEEN_REQUEST_IDS = 10_000
+seen_request_ids: OrderedDict = OrderedDict()
+# номер последнего применённого изменения статусов звонков по пайплайнам
+voice_status_seq: Dict[str, int] = {}
 
-app = FastAPI()
+
+app = FastAPI(default_response_class=FastJSONResponse)
+
+
+def remember_request(request_id):
+    if request_id is not None:
+        seen_request_ids[request_id] = None
+        if len(seen_request_ids) > SEEN_REQUEST_IDS:
+            seen_request_ids.popitem(last=False)
 
 
 runner = Runner(
@@ -98,7 +113,13 @@ async def update_session_state_ws(websocket: WebSocket):
 
     try:
         while True:
-            data: Dict[str, Any] = await websocket.receive_json()
+            data: Dict[str, Any] = loads(await websocket.receive_text())
+
+            # Task Manager переотправляет неподтверждённые обновления после переподключения - второй раз их не применяем
+            request_id = data.get("request_id")
+            if request_id is not None and request_id in seen_request_ids:
+                await websocket.send_json({"message": "Already applied.", "request_id": request_id})
+                continue
 
             user_id = data.get("user_id")
             session_id = data.get("session_id")
@@ -119,17 +140,25 @@ async def update_session_state_ws(websocket: WebSocket):
          
             if (type_of_component == "ai_matching"):
                 people = data.get("candidates")
+                # слитое с более новым событие может повторить уже применённых кандидатов - добавляем их один раз
+                known_ids = {candidate["id"] for candidate in new_interaction_history["сandidates"][index_of_pipeline] or []}
                 for batch in people:
                     candidates = batch["result"]
                     if (candidates != None):
                         for candidate in candidates:
+                            if candidate["id"] in known_ids:
+                                continue
+                            known_ids.add(candidate["id"])
                             print("Candidate:",  candidate )
                             new_interaction_history["сandidates"][index_of_pipeline].append(candidate) 
                             new_interaction_history["candidates_truncated"][index_of_pipeline].append(
                                 " ".join([str(candidate["id"]), candidate["person_name"]]) )
 
 
-                if (len(new_interaction_history["сandidates"][index_of_pipeline]) == 0):
+                if data.get("partial"):
+                        # промежуточный батч: итог поиска придёт отдельным сообщением
+                        text += f"AI Matching found new candidates for pipeline {index_of_pipeline}, search is still running \n"
+                elif (len(new_interaction_history["сandidates"][index_of_pipeline]) == 0):
                         
                         new_interaction_history["сandidates"][index_of_pipeline] = None  
                         text += f"Candidates for pipeline {index_of_pipeline} have not been found for the resume!" 
@@ -137,17 +166,34 @@ async def update_session_state_ws(websocket: WebSocket):
                         text += f"We have found at least one candidate for pipeline {index_of_pipeline} for the resume" 
 
 
+            # что-то, кроме повторения уже известного состояния, пришло
+            changed = any(new_interaction_history["pipelines"][index_of_pipeline]["chain"][index_of_component]["status"].get(key) != value
+                          for key, value in state_changes.items())
+
             if (type_of_component == "voice_bot_component"):
                 print(data)
+                if data.get("status_changes") is not None:
+                    # приходят только изменившиеся статусы; если часть изменений пропущена - просим полный список
+                    last_seq = voice_status_seq.get(index_of_pipeline, 0)
+                    if data.get("base_seq") != last_seq:
+                        await websocket.send_json({"message": "Snapshot required.", "request_id": request_id,
+                                                   "snapshot_required": True, "seq": last_seq})
+                        continue
+                    status_about_each_candidate = [change["status"] for change in data["status_changes"]]
+                else:
+                    status_about_each_candidate = data.get("status_about_each_candidate")
+                if data.get("seq") is not None:
+                    voice_status_seq[index_of_pipeline] = data["seq"]
+
                 if  data.get("finish_task") != None:
                     print(data.get("finish_task"))
 
                     finish_task = data.get("finish_task")
-                    status_about_each_candidate = data.get("status_about_each_candidate")
-                    for status in status_about_each_candidate:
+                    for status in status_about_each_candidate or []:
                         print(f"status about the person: {status}")
                         if status["accept_call"] == True and status["candidate_name"] not in new_interaction_history["candidates_screened"][index_of_pipeline]:
                             new_interaction_history["candidates_screened"][index_of_pipeline].append(status["candidate_name"])
+                            changed = True
 
                         if status["approved"] == True and status["candidate_name"] not in new_interaction_history["candidates_approved_offer"][index_of_pipeline]:
                             new_interaction_history["candidates_approved_offer"][index_of_pipeline].append(status["candidate_name"])
@@ -161,6 +207,12 @@ async def update_session_state_ws(websocket: WebSocket):
                     if finish_task and state_changes["COMPLETED"] == False:
                         text += f"Calling of candidates for pipeline number {index_of_pipeline} was interrupted! \n" 
 
+                if not changed and not text:
+                    # статусы без новостей для агента: событие в сессию не добавляем
+                    remember_request(request_id)
+                    await websocket.send_json({"message": "Nothing to update.", "request_id": request_id})
+                    continue
+
 
 
             for key,value in state_changes.items():
@@ -185,8 +237,9 @@ async def update_session_state_ws(websocket: WebSocket):
                 
             
             await session_service.append_event(session, system_event)
+            remember_request(request_id)
 
-            await websocket.send_json({"message": "Session state updated successfully."})
+            await websocket.send_json({"message": "Session state updated successfully.", "request_id": request_id})
 
     except WebSocketDisconnect:
         print("Cleint has been disconected")
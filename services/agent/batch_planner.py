@@ -0,0 +1,76 @@
+import json
+from typing import Optional
+
+# Примерно 4 символа JSON на токен - этого достаточно, чтобы не переполнять контекст модели
+CHARS_PER_TOKEN = 4
+# Инструкция агента и обёртка input_schema
+PROMPT_OVERHEAD_TOKENS = 600
+
+
+def estimate_tokens(value) -> int:
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class BatchPlanner:
+    """Packs candidates into LLM calls by estimated token count.
+
+    Each batch stays under `token_budget` tokens and holds at most `max_candidates`
+    resumes. The planner also keeps an EWMA of the observed latency per batch size
+    and narrows the cap to the size with the best candidates-per-second, probing one
+    size up while the largest observed size is still the best one.
+    """
+
+    def __init__(self, token_budget: int = 8000, max_candidates: int = 10, min_samples: int = 3, alpha: float = 0.3):
+        self.token_budget = token_budget
+        self.max_candidates = max_candidates
+        self.min_samples = min_samples
+        self.alpha = alpha
+        self.latency: dict[int, float] = {}
+        self.samples: dict[int, int] = {}
+
+    def record(self, size: int, seconds: float):
+        if size <= 0:
+            return
+        previous = self.latency.get(size)
+        self.latency[size] = seconds if previous is None else (1 - self.alpha) * previous + self.alpha * seconds
+        self.samples[size] = self.samples.get(size, 0) + 1
+
+    def best_size(self, max_candidates: Optional[int] = None) -> int:
+        cap = max_candidates or self.max_candidates
+        measured = {size: size / latency for size, latency in self.latency.items()
+                    if size <= cap and latency > 0 and self.samples[size] >= self.min_samples}
+        if not measured:
+            return cap
+        best = max(measured, key=measured.get)
+        if best == max(measured) and best < cap:
+            return best + 1
+        return best
+
+    def plan(self, candidates: list[dict], jobpost: str, token_budget: Optional[int] = None,
+             max_candidates: Optional[int] = None) -> list[tuple[int, list[dict]]]:
+        """(offset, batch) pairs in pool order; a resume larger than the budget goes alone."""
+        budget = (token_budget or self.token_budget) - PROMPT_OVERHEAD_TOKENS - estimate_tokens(jobpost)
+        cap = self.best_size(max_candidates)
+
+        batches = []
+        batch, batch_tokens, offset = [], 0, 0
+        for position, candidate in enumerate(candidates):
+            tokens = estimate_tokens(candidate)
+            if batch and (len(batch) == cap or batch_tokens + tokens > budget):
+                batches.append((offset, batch))
+                batch, batch_tokens, offset = [], 0, position
+            batch.append(candidate)
+            batch_tokens += tokens
+        if batch:
+            batches.append((offset, batch))
+        return batches
+
+    def stats(self) -> dict:
+        return {
+            "token_budget": self.token_budget,
+            "max_candidates": self.max_candidates,
+            "best_size": self.best_size(),
+            "latency_by_size": {size: {"ewma_seconds": self.latency[size], "samples": self.samples[size]}
+                                for size in sorted(self.latency)},
+        }
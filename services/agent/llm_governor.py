@@ -0,0 +1,148 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+# ADK отдаёт RateLimitError LiteLLM как 500 (часто без текста ошибки), поэтому любой 5xx - сигнал сбавить темп,
+# а для остальных ошибок смотрим на текст ответа
+RATE_LIMIT_MARKERS = ("ratelimit", "rate limit", "rate_limit", "too many requests", "quota exceeded")
+
+
+def is_throttled(status_code: int, body: bytes) -> bool:
+    """Whether a provider response means "slow down": 429, any 5xx, or an error that mentions a rate limit."""
+    if status_code == 429 or status_code >= 500:
+        return True
+    if status_code < 400:
+        return False
+    text = body[:4096].decode("utf-8", "ignore").lower()
+    return any(marker in text for marker in RATE_LIMIT_MARKERS)
+
+
+class LlmGovernor:
+    """One limit on LLM calls for the whole process, shared by every search.
+
+    A call waits for a concurrency slot and for both token buckets: requests per second
+    (`rps`, bursts up to `burst`) and estimated tokens per minute (`tpm`); 0 disables a bucket.
+    The concurrency limit is AIMD: it grows by about one slot per `limit` successful calls
+    and is multiplied by `backoff` after a throttled call (see `is_throttled`) or a latency spike,
+    at most once per `cooldown` seconds.
+    """
+
+    def __init__(self, rps: float = 5, tpm: float = 200_000, burst: float = 5, initial_limit: int = 4,
+                 min_limit: int = 1, max_limit: int = 32, backoff: float = 0.5, spike_factor: float = 3.0,
+                 cooldown: float = 2.0, alpha: float = 0.2):
+        self.rps = rps
+        self.tpm = tpm
+        self.burst = max(burst, 1)
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.spike_factor = spike_factor
+        self.cooldown = cooldown
+        self.alpha = alpha
+        self.request_tokens = self.burst
+        self.minute_tokens = float(tpm)
+        self.refilled_at = time.monotonic()
+        self.decreased_at = 0.0
+        self.condition = asyncio.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.latency_ewma = None
+        self.wait_ewma = 0.0
+        self.wait_max = 0.0
+        self.calls = 0
+        self.throttled = 0
+        self.spikes = 0
+
+    def refill(self, now: float):
+        elapsed = now - self.refilled_at
+        self.refilled_at = now
+        if self.rps:
+            self.request_tokens = min(self.burst, self.request_tokens + elapsed * self.rps)
+        if self.tpm:
+            self.minute_tokens = min(self.tpm, self.minute_tokens + elapsed * self.tpm / 60)
+
+    def bucket_delay(self, tokens: int) -> float:
+        """Seconds until both buckets can pay for a call of `tokens` tokens."""
+        self.refill(time.monotonic())
+        delay = 0.0
+        if self.rps and self.request_tokens < 1:
+            delay = (1 - self.request_tokens) / self.rps
+        if self.tpm and self.minute_tokens < tokens:
+            delay = max(delay, (tokens - self.minute_tokens) * 60 / self.tpm)
+        return delay
+
+    async def acquire(self, tokens: int):
+        # вызов больше минутного лимита целиком не поместится никогда - ждём полного ведра
+        tokens = min(tokens, self.tpm) if self.tpm else tokens
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            async with self.condition:
+                while True:
+                    timeout = None
+                    if self.in_flight < int(self.limit):
+                        timeout = self.bucket_delay(tokens)
+                        if timeout == 0:
+                            break
+                    try:
+                        await asyncio.wait_for(self.condition.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                if self.rps:
+                    self.request_tokens -= 1
+                if self.tpm:
+                    self.minute_tokens -= tokens
+                self.in_flight += 1
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - started
+        self.wait_ewma = (1 - self.alpha) * self.wait_ewma + self.alpha * waited
+        self.wait_max = max(self.wait_max, waited)
+
+    async def release(self, seconds: float, throttled: bool, completed: bool = True):
+        if completed or throttled:
+            self.adapt(seconds, throttled)
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def adapt(self, seconds: float, throttled: bool):
+        now = time.monotonic()
+        self.calls += 1
+        spike = (not throttled and self.latency_ewma is not None
+                 and seconds > self.spike_factor * self.latency_ewma)
+        if throttled or spike:
+            self.throttled += throttled
+            self.spikes += spike
+            if now - self.decreased_at >= self.cooldown:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self.decreased_at = now
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        if not throttled:
+            self.latency_ewma = seconds if self.latency_ewma is None else (1 - self.alpha) * self.latency_ewma + self.alpha * seconds
+
+    @asynccontextmanager
+    async def slot(self, tokens: int):
+        """Holds one LLM call; set call["throttled"] = True inside if the provider pushed back.
+
+        Calls that were cancelled or failed do not move the limit unless they were throttled.
+        """
+        await self.acquire(tokens)
+        call = {"throttled": False}
+        started = time.monotonic()
+        completed = False
+        try:
+            yield call
+            completed = True
+        finally:
+            await self.release(time.monotonic() - started, call["throttled"], completed)
+
+    def stats(self) -> dict:
+        self.refill(time.monotonic())
+        return {"limit": round(self.limit, 2), "in_flight": self.in_flight, "queue_depth": self.waiting,
+                "wait_seconds_ewma": round(self.wait_ewma, 4), "wait_seconds_max": round(self.wait_max, 4),
+                "latency_seconds_ewma": self.latency_ewma, "calls": self.calls, "throttled": self.throttled,
+                "latency_spikes": self.spikes, "rps": self.rps, "tpm": self.tpm,
+                "minute_tokens_available": int(self.minute_tokens)}
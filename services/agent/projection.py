@@ -0,0 +1,75 @@
+from typing import Iterable, Optional
+from .batch_planner import estimate_tokens
+
+# Поля, которые влияют на решение модели; контакты, имя и дата ревизии в промпт не идут
+MATCH_FIELDS = ("id", "headline", "location", "summary", "skills", "languages", "work_experience", "education")
+
+# Поле резюме -> поле models.candidate_resume.ProjectedResume. Других ключей проекция не выдаёт:
+# входная схема агентов и описание ключей в их инструкциях строятся по ProjectedResume
+COMPACT_KEYS = {
+    "id": "id",
+    "headline": "h",
+    "location": "loc",
+    "summary": "s",
+    "skills": "sk",
+    "languages": "lang",
+    "work_experience": "exp",
+    "education": "edu",
+}
+
+
+def truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars].rsplit(" ", 1)[0] or text[:max_chars]
+    return cut.rstrip(" ,.;:") + "…"
+
+
+def position_line(position: dict) -> str:
+    return f"{position['position_title']} @ {position['company_name']} ({position['start_date']}–{position['end_date']})"
+
+
+def education_line(education: dict) -> str:
+    line = f"{education['degree_name']}, {education['institution_name']}"
+    return f"{line} ({education['end_year']})" if education.get("end_year") else line
+
+
+class ResumeProjection:
+    """What part of a resume goes into the matching prompt.
+
+    Only `fields` (a subset of `COMPACT_KEYS`) are kept, the summary is cut to
+    `summary_chars`, work experience and education are flattened to one line per entry
+    and keys are renamed to the short names of `COMPACT_KEYS`.
+    """
+
+    def __init__(self, fields: Iterable[str] = MATCH_FIELDS, summary_chars: Optional[int] = 300):
+        self.fields = tuple(fields)
+        unknown = [field for field in self.fields if field not in COMPACT_KEYS]
+        if unknown:
+            raise ValueError(f"Fields {unknown} are not part of ProjectedResume")
+        if "id" not in self.fields:
+            # по id ответ модели сопоставляется с исходными резюме
+            self.fields = ("id",) + self.fields
+        self.summary_chars = summary_chars
+
+    def project(self, candidate: dict) -> dict:
+        projected = {}
+        for field in self.fields:
+            value = candidate.get(field)
+            if value is None or value == [] or value == "":
+                continue
+            if field == "summary" and self.summary_chars:
+                value = truncate(value, self.summary_chars)
+            elif field == "work_experience":
+                value = [position_line(position) for position in value]
+            elif field == "education":
+                value = [education_line(education) for education in value]
+            projected[COMPACT_KEYS[field]] = value
+        return projected
+
+    def project_many(self, candidates: list[dict]) -> tuple[list[dict], dict]:
+        """Projected candidates and the estimated input tokens before and after projection."""
+        projected = [self.project(candidate) for candidate in candidates]
+        tokens_full = sum(estimate_tokens(candidate) for candidate in candidates)
+        tokens_projected = sum(estimate_tokens(candidate) for candidate in projected)
+        return projected, {"input_tokens": tokens_projected, "input_tokens_saved": tokens_full - tokens_projected}
@@ -0,0 +1 @@
+from .agent import root_agent
\ No newline at end of file
@@ -0,0 +1,39 @@
+from google.adk.agents import Agent
+from google.adk.models.lite_llm import LiteLlm
+from config.secrets import OPENAI_API_KEY
+from models.input_schema import input_schema
+from models.candidate_resume import PROJECTED_RESUME_LEGEND
+from services.agent.session_pool import POOLED_INCLUDE_CONTENTS
+from models.output_schema_for_agent import match_ids_output_schema
+
+
+model = LiteLlm(
+    model = "openai/gpt-4o-mini",
+    api_key = OPENAI_API_KEY
+)
+
+# Тот же матчинг, что и resume_search_llm, но модель возвращает только id кандидатов:
+# резюме целиком восстанавливаются на стороне AI Matching, выходных токенов в разы меньше
+root_agent = Agent(
+    name="resume_match_llm",
+    model=model,
+    description="Agent that returns the ids of the resumes that fit a given job description.",
+    instruction=f"""
+    You are an AI agent that helps recruiters search for appropriate resumes.
+
+    Your job:
+    - Analyze the provided job description in the field "desired_resume".
+    - Decide which resumes from "list_of_candidates" fit it, matching required skills, years of experience and role responsibilities.
+
+    Candidates come in a compact form: {PROJECTED_RESUME_LEGEND}.
+
+    Return only the matching candidates in "matches": the "id" exactly as in the input, a relevance "score"
+    from 0 to 100 and a short "reason" (at most 15 words). Never copy resume fields into the answer.
+    Order the matches from the best to the worst. If no candidate fits, return an empty list.
+    """,
+
+    input_schema= input_schema,
+    output_schema= match_ids_output_schema,
+    include_contents=POOLED_INCLUDE_CONTENTS,
+    disallow_transfer_to_parent=True, disallow_transfer_to_peers=True
+)
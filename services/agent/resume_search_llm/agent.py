@@ -3,6 +3,8 @@ from google.adk.tools import google_search
 from google.adk.models.lite_llm import LiteLlm
 from config.secrets import OPENAI_API_KEY
 from models.input_schema import input_schema
+from models.candidate_resume import PROJECTED_RESUME_LEGEND
+from services.agent.session_pool import POOLED_INCLUDE_CONTENTS
 from models.output_schema_for_agent import output_schema 
 
 
@@ -15,7 +17,7 @@ root_agent = Agent(
     name="resume_search_llm",
     model=model,
     description="Agent that finds the most suitable resumes for a given job description or candidate requirements.",
-    instruction="""
+    instruction=f"""
     You are an AI agent that helps recruiters search for appropriate resumes.
 
     Your job:
@@ -26,6 +28,9 @@ root_agent = Agent(
 
     Be precise and concise. Do not invent irrelevant data. Always justify why the resume fits.
 
+    Candidates come in a compact form: {PROJECTED_RESUME_LEGEND}.
+    Keep the "id" of every candidate you return.
+
     You should return just the list of the cadndiates in json format that matches the text in the field called "desired resume" in the input schema! Don't change the initial jsons just return the list of json that matches my requrements!
  
     If candidates that match our desired description don't exist just 
@@ -33,6 +38,7 @@ root_agent = Agent(
 
     input_schema= input_schema,
     output_schema= output_schema,
+    include_contents=POOLED_INCLUDE_CONTENTS,
     disallow_transfer_to_parent=True, disallow_transfer_to_peers=True
 )
 
@@ -1,93 +1,303 @@
 
 from dotenv import load_dotenv
-import json 
+import os
 import asyncio, httpx
-from math import ceil
+import heapq
+import time
+from pathlib import Path
+from .verdict_cache import VerdictCache
+from .batch_planner import BatchPlanner, estimate_tokens, PROMPT_OVERHEAD_TOKENS
+from .session_pool import AdkSessionPool
+from .projection import ResumeProjection, MATCH_FIELDS
+from .llm_governor import LlmGovernor, is_throttled
+from models.codec import dumps_str, json_body, loads
+from models.output_schema_for_agent import match_ids_output_schema, output_schema
+from pydantic import ValidationError
 
 load_dotenv()
 
-client_ai_matching_agent = httpx.AsyncClient(timeout=None)
-client_create_session_in_adk = httpx.AsyncClient(timeout=None)
-client_delete_session_in_adk = httpx.AsyncClient(timeout=None)
+# Вердикты LLM по паре (вакансия, кандидат) переживают перезапуск: повторный поиск спрашивает LLM только о новых
+verdict_cache = VerdictCache(os.environ.get("AI_MATCHING_VERDICT_CACHE", str(Path(__file__).parent / "verdict_cache.sqlite3")),
+                             ttl=float(os.environ.get("AI_MATCHING_VERDICT_TTL", 7 * 24 * 3600)),
+                             max_entries=int(os.environ.get("AI_MATCHING_VERDICT_CACHE_SIZE", 100_000)))
+
+# Размер батча подбирается по оценке токенов и наблюдаемой задержке модели
+batch_planner = BatchPlanner(token_budget=int(os.environ.get("AI_MATCHING_TOKEN_BUDGET", 8000)),
+                             max_candidates=int(os.environ.get("AI_MATCHING_MAX_BATCH", 10)))
+
+# В промпт уходят только значимые для матчинга поля резюме под короткими ключами ProjectedResume
+projection = ResumeProjection(fields=os.environ.get("AI_MATCHING_PROJECTION_FIELDS", ",".join(MATCH_FIELDS)).split(","),
+                              summary_chars=int(os.environ.get("AI_MATCHING_SUMMARY_CHARS", 300)))
+
+# Один лимит на вызовы LLM для всех поисков процесса: RPS, токены в минуту и AIMD-лимит параллельности
+llm_governor = LlmGovernor(rps=float(os.environ.get("AI_MATCHING_LLM_RPS", 5)),
+                           tpm=float(os.environ.get("AI_MATCHING_LLM_TPM", 200_000)),
+                           initial_limit=int(os.environ.get("AI_MATCHING_LLM_CONCURRENCY", 4)),
+                           max_limit=int(os.environ.get("AI_MATCHING_LLM_MAX_CONCURRENCY", 32)))
+# Запас на ответ модели при оценке токенов вызова
+OUTPUT_TOKENS_PER_CANDIDATE = 30
+# Потолок score в ответе модели: когда k-й балл top-k дошёл до него, оставшиеся батчи его уже не побьют
+MAX_MATCH_SCORE = 100
+
+# ids - агент resume_match_llm возвращает только id (с оценкой и причиной), echo - resume_search_llm повторяет резюме
+MATCH_RESPONSE_MODE = os.environ.get("AI_MATCHING_RESPONSE_MODE", "ids")
+ADK_APP_NAME = "resume_match_llm" if MATCH_RESPONSE_MODE == "ids" else "resume_search_llm"
+ANSWER_SCHEMA = match_ids_output_schema if MATCH_RESPONSE_MODE == "ids" else output_schema
+
+client_adk = httpx.AsyncClient(base_url="http://localhost:8000", timeout=None)
 client_calling_agent = httpx.AsyncClient(timeout=None)
 
+# Тёплые сессии ADK: батч берёт готовую сессию вместо пары create/delete на каждый вызов
+session_pool = AdkSessionPool(client_adk, app_name=ADK_APP_NAME, user_id="u_123",
+                              min_size=int(os.environ.get("AI_MATCHING_SESSION_POOL_MIN", 2)),
+                              max_idle=int(os.environ.get("AI_MATCHING_SESSION_POOL_MAX", 32)))
 
-            
-async def create_session(i):
-        url = f"http://localhost:8000/apps/resume_search_llm/users/u_123/sessions/{i}"
-        r = await client_create_session_in_adk.post(url)   
-        r.raise_for_status()
-        return r.json()
-
-async def delete_session(i):
-        url = f"http://localhost:8000/apps/resume_search_llm/users/u_123/sessions/{i}"
-        r = await client_delete_session_in_adk.delete(url)   
-        r.raise_for_status()
-        return r.json()
-
-async def search(candidates, description_of_resume, index_of_session, conditions, sem):
-        async with sem:
-            
-            async with conditions["lock"]:
-                if conditions["number_of_candidates"] <= 0:
-                    return {"result" : None}
 
-            try: 
-                url = f"http://localhost:8000/run"
-                await create_session(index_of_session)
+def parse_matches(parsed: dict) -> list[dict]:
+    # в режиме echo модель повторяет проекции резюме, в режиме ids - возвращает {"id", "score", "reason"}
+    matches = parsed.get("matches") if MATCH_RESPONSE_MODE == "ids" else parsed.get("list_of_candidates")
+    return [match for match in matches or [] if isinstance(match, dict)]
+
+
+def is_complete_answer(event: dict, parsed) -> bool:
+    # ответ, оборванный по лимиту токенов или не прошедший схему агента, ничего не говорит о пропущенных кандидатах
+    if event.get("finishReason") not in (None, "STOP"):
+        return False
+    try:
+        ANSWER_SCHEMA.model_validate(parsed)
+    except ValidationError:
+        return False
+    return True
+
 
-                dictionary = {"desired_resume":  description_of_resume, "list_of_candidates": candidates}
+def matched_resume(candidate: dict, verdict: dict) -> dict:
+    extra = {f"match_{key}": verdict[key] for key in ("score", "reason") if verdict.get(key) is not None}
+    return {**candidate, **extra} if extra else candidate
+
+
+async def match_batch(candidates, projected, description_of_resume):
+        """Asks the LLM about one batch; returns the matched resumes and caches the verdicts.
+
+        Candidates missing from a complete answer are cached as not matched; after a truncated
+        or invalid answer only the returned matches are cached.
+        """
+        tokens = (PROMPT_OVERHEAD_TOKENS + estimate_tokens(description_of_resume) + estimate_tokens(projected)
+                  + OUTPUT_TOKENS_PER_CANDIDATE * len(candidates))
+        async with llm_governor.slot(tokens) as call:
+            async with session_pool.session() as session_id:
+                dictionary = {"desired_resume":  description_of_resume, "list_of_candidates": projected}
                 payload = {
-                    "app_name": "resume_search_llm",
+                    "app_name": ADK_APP_NAME,
                     "user_id": "u_123",
-                    "session_id": f"{index_of_session}", 
+                    "session_id": session_id, 
                     "new_message": {
                         "role": "user",
                         "parts": [
-                            {"text" : json.dumps(dictionary)}
+                            {"text" : dumps_str(dictionary)}
                         ]      
                     }
                 }
             
-                answer = await client_ai_matching_agent.post(url, json=payload)  
-                clean_text = answer.json()[0]["content"]["parts"][0]["text"]
-                parsed = json.loads(clean_text)
+                started = time.monotonic()
+                answer = await client_adk.post("/run", **json_body(payload))  
+                call["throttled"] = is_throttled(answer.status_code, answer.content)
                 answer.raise_for_status()
+                batch_planner.record(len(candidates), time.monotonic() - started)
+                event = loads(answer.content)[0]
+                clean_text = event["content"]["parts"][0]["text"]
+                parsed = loads(clean_text)
                 
                 if parsed is None or not isinstance(parsed, dict):
-                    return {"result": None}
+                    return []
                 
-                candidates_list = parsed.get("list_of_candidates")
-                if candidates_list is None or len(candidates_list) == 0:
-                    return {"result": None}
-                
-                async with conditions["lock"]:
-                    if conditions["number_of_candidates"] <= 0:
-                        return {"result" : None}
-                    else: 
-                         number_found_candidates = len(parsed["list_of_candidates"])
-                         how_many_can_be_added = min(conditions["number_of_candidates"], number_found_candidates)
+                # модель видит только проекцию резюме: полные резюме восстанавливаются из батча по id
+                by_id = {candidate["id"]: candidate for candidate in candidates}
+                verdicts = {}
+                for match in parse_matches(parsed):
+                    if match.get("id") in by_id and match["id"] not in verdicts:
+                        verdicts[match["id"]] = {"matched": True, "score": match.get("score"), "reason": match.get("reason")}
+                # кандидат, которого нет в полном ответе, модель отвергла. Если ответ обрезан или не прошёл
+                # схему, про пропущенных кандидатов ничего не известно - их спросим снова в следующем поиске
+                rejected = ([candidate for candidate in candidates if candidate["id"] not in verdicts]
+                            if is_complete_answer(event, parsed) else [])
+                await asyncio.to_thread(verdict_cache.put_many, description_of_resume,
+                                        [(by_id[candidate_id], verdict) for candidate_id, verdict in verdicts.items()]
+                                        + [(candidate, {"matched": False}) for candidate in rejected])
+                return [matched_resume(by_id[candidate_id], verdict) for candidate_id, verdict in verdicts.items()]
 
-                         #await client_calling_agent.post("http://0.0.0.0:8002/call_webhook", json = parsed["list_of_candidates"])  
 
-                         conditions["number_of_candidates"] -= how_many_can_be_added
-                
-                return {"result" : parsed["list_of_candidates"][:how_many_can_be_added]}
-            
-            finally:
-                 await delete_session(index_of_session)
+async def search(candidates, projected, description_of_resume, conditions):
+        async with conditions["lock"]:
+            if conditions["number_of_candidates"] <= 0:
+                return {"result" : None}
+
+        candidates_list = await match_batch(candidates, projected, description_of_resume)
+
+        if len(candidates_list) == 0:
+            return {"result": None}
+        
+        async with conditions["lock"]:
+            if conditions["number_of_candidates"] <= 0:
+                return {"result" : None}
+            else: 
+                 number_found_candidates = len(candidates_list)
+                 how_many_can_be_added = min(conditions["number_of_candidates"], number_found_candidates)
+
+                 #await client_calling_agent.post("http://0.0.0.0:8002/call_webhook", json = parsed["list_of_candidates"])  
+
+                 conditions["number_of_candidates"] -= how_many_can_be_added
+                 conditions["committed"].add(asyncio.current_task())
+                 if conditions["number_of_candidates"] <= 0:
+                     conditions["done"].set()
+        
+        return {"result" : candidates_list[:how_many_can_be_added]}
 
 
+async def as_completed_until_quota(tasks, conditions):
+    # Отдаёт батчи по мере готовности. Как только нужное число кандидатов набрано, оставшиеся батчи отменяются:
+    # и те, что ждут очереди к LLM, и те, что уже ждут ответа.
+    # Батчи, которые уже забрали часть квоты (committed), только дожидаемся - они возвращают сессию в пул
+    done = conditions["done"]
+    pending = set(tasks)
+    quota_filled = asyncio.create_task(done.wait())
+    try:
+        while pending and not done.is_set():
+            finished, pending = await asyncio.wait(pending | {quota_filled}, return_when=asyncio.FIRST_COMPLETED)
+            pending.discard(quota_filled)
+            for task in finished - {quota_filled}:
+                yield task
 
-async def searching_of_candidates(jobpost, number_of_candidates, data, start_index):
-    batch_size = 5
-    sem = asyncio.Semaphore(number_of_candidates + 2)  
+        committed = pending & conditions["committed"]
+        pending -= committed
+        if committed:
+            await asyncio.wait(committed)
+        for task in committed:
+            yield task
+    finally:
+        # сюда же попадаем, если потребитель перестал читать (например, клиент SSE отключился)
+        quota_filled.cancel()
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if pending:
+            reason = "Квота набрана" if conditions["done"].is_set() else "Поиск прерван"
+            print(f"{reason}, отменили {len(pending)} батчей")
+
+
+def batch_result(task):
+    if task.cancelled():
+        return {"result": None}
+    if task.exception() is not None:
+        print(f"Батч завершился с ошибкой: {task.exception()!r}")
+        return {"result": None}
+    return task.result()
+
+
+async def iter_searching_of_candidates(jobpost, number_of_candidates, data, token_budget=None, max_batch_size=None, on_plan=None):
+    """Yields {"result": [...] | None} per batch in completion order, starting with matches from the verdict cache.
+
+    on_plan, if given, is called once with {"batches_total", "input_tokens", "input_tokens_saved"}:
+    the number of batches that will be yielded at most and the estimated prompt tokens with and
+    without the savings of the resume projection.
+    """
     lock = asyncio.Lock()
-    conditions = {"number_of_candidates" : number_of_candidates, "lock": lock}
-    res = await asyncio.gather(*[search(data[index: index+batch_size], jobpost, index + start_index, conditions, sem) 
-                                 for index in range(0, len(data), batch_size)])
-    print("результаты в ai matching: ", res)
-    return res
-    
+    conditions = {"number_of_candidates" : number_of_candidates, "lock": lock, "done": asyncio.Event(), "committed": set()}
+
+    cached = await asyncio.to_thread(verdict_cache.get_many, jobpost, data)
+    matched_from_cache = [matched_resume(candidate, cached[candidate["id"]]) for candidate in data
+                          if cached.get(candidate["id"], {}).get("matched")][:number_of_candidates]
+    conditions["number_of_candidates"] -= len(matched_from_cache)
+    data = [candidate for candidate in data if candidate["id"] not in cached]
+    print(f"Кэш вердиктов: {len(cached)} попаданий, {len(data)} кандидатов уйдут в LLM")
+
+    projected, tokens = projection.project_many(data)
+    print(f"Проекция резюме: ~{tokens['input_tokens']} токенов на вход, сэкономлено ~{tokens['input_tokens_saved']}")
+    # батчи собираются по размеру проекций - именно они попадают в промпт
+    batches = batch_planner.plan(projected, jobpost, token_budget=token_budget, max_candidates=max_batch_size)
+    print(f"Батчей: {len(batches)}, размеры: {[len(batch) for _, batch in batches]}")
+    if on_plan is not None:
+        on_plan({"batches_total": len(batches) + (1 if matched_from_cache else 0), **tokens})
+    if matched_from_cache:
+        yield {"result": matched_from_cache}
+    tasks = [asyncio.create_task(search(data[offset:offset + len(batch)], batch, jobpost, conditions))
+             for offset, batch in batches]
+    async for task in as_completed_until_quota(tasks, conditions):
+        yield batch_result(task)
+
 
+def batch_bound(batch: list[dict], ranks: dict[int, int]) -> tuple:
+    """Best heap item any candidate of the batch could make: the score cap with the batch's best prefilter rank."""
+    return MAX_MATCH_SCORE, -min(ranks[candidate["id"]] for candidate in batch)
 
+
+async def iter_ranked_candidates(jobpost, number_of_candidates, data, token_budget=None, max_batch_size=None, on_plan=None):
+    """Top-k by LLM score across all batches: {"result": None} per finished batch, then {"result": top-k, best first}.
+
+    Batches go out in the order of `data` (prefilter rank). Once k candidates are held and the k-th
+    score has reached MAX_MATCH_SCORE, batches that cannot beat it (see batch_bound) are cancelled,
+    so the top-k stays exact. Ties are broken by prefilter rank, so the same scores give the same top-k.
+    """
+    data = list({candidate["id"]: candidate for candidate in data}.values())
+    ranks = {candidate["id"]: rank for rank, candidate in enumerate(data)}
+    # min-куча по (балл, -ранг): на вершине худший из лучших k
+    heap, resumes = [], {}
+
+    def offer(resume):
+        # балл вне шкалы обрезается, иначе потолок MAX_MATCH_SCORE не был бы оценкой сверху
+        item = (min(resume.get("match_score") or 0, MAX_MATCH_SCORE), -ranks[resume["id"]], resume["id"])
+        if len(heap) < number_of_candidates:
+            heapq.heappush(heap, item)
+        elif heap and item > heap[0]:
+            resumes.pop(heapq.heapreplace(heap, item)[2], None)
+        else:
+            return
+        resumes[resume["id"]] = resume
+
+    cached = await asyncio.to_thread(verdict_cache.get_many, jobpost, data)
+    for candidate in data:
+        if cached.get(candidate["id"], {}).get("matched"):
+            offer(matched_resume(candidate, cached[candidate["id"]]))
+    data = [candidate for candidate in data if candidate["id"] not in cached]
+    print(f"Кэш вердиктов: {len(cached)} попаданий, {len(data)} кандидатов уйдут в LLM")
+
+    projected, tokens = projection.project_many(data)
+    print(f"Проекция резюме: ~{tokens['input_tokens']} токенов на вход, сэкономлено ~{tokens['input_tokens_saved']}")
+    batches = batch_planner.plan(projected, jobpost, token_budget=token_budget, max_candidates=max_batch_size)
+    print(f"Батчей: {len(batches)}, размеры: {[len(batch) for _, batch in batches]}")
+    if on_plan is not None:
+        on_plan({"batches_total": len(batches) + 1, **tokens})
+
+    tasks = {asyncio.create_task(match_batch(data[offset:offset + len(batch)], batch, jobpost)): data[offset:offset + len(batch)]
+             for offset, batch in batches}
+    pending, stopped = set(tasks), 0
+    try:
+        while pending:
+            finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                # batch_result только печатает ошибку упавшего батча
+                matched = task.result() if not task.cancelled() and task.exception() is None else batch_result(task)["result"] or []
+                for resume in matched:
+                    offer(resume)
+                yield {"result": None}
+            if len(heap) == number_of_candidates and number_of_candidates > 0:
+                beaten = {task for task in pending if batch_bound(tasks[task], ranks) <= heap[0][:2]}
+                for task in beaten:
+                    task.cancel()
+                pending -= beaten
+                stopped += len(beaten)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    if stopped:
+        print(f"Ранняя остановка: {stopped} батчей не могли попасть в top-{number_of_candidates}")
+    yield {"result": [resumes[candidate_id] for _, _, candidate_id in sorted(heap, reverse=True)] or None}
+
+
+async def searching_of_candidates(jobpost, number_of_candidates, data, token_budget=None, max_batch_size=None):
+    res = [batch async for batch in iter_searching_of_candidates(jobpost, number_of_candidates, data,
+                                                                 token_budget=token_budget, max_batch_size=max_batch_size)]
+    print("результаты в ai matching: ", res)
+    return res
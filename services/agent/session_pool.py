@@ -0,0 +1,112 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+import httpx
+
+# include_contents агентов, чьи сессии берутся из пула (см. AdkSessionPool)
+POOLED_INCLUDE_CONTENTS = "none"
+
+
+class AdkSessionPool:
+    """Warm ADK sessions that matching batches lease and give back.
+
+    The matching agents run with include_contents=POOLED_INCLUDE_CONTENTS ("none"): every
+    batch is self-contained, so a reused session does not feed earlier batches into the
+    prompt and giving a session back costs nothing. A
+    session is recycled (deleted in the background) after `max_uses` runs or when
+    its batch failed or was cancelled. Idle sessions above `min_size` are deleted
+    after `idle_timeout` seconds.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, app_name: str, user_id: str,
+                 min_size: int = 2, max_idle: int = 32, max_uses: int = 50, idle_timeout: float = 120):
+        self.client = client
+        self.app_name = app_name
+        self.user_id = user_id
+        self.min_size = min_size
+        self.max_idle = max_idle
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        self.idle: deque[tuple[str, int, float]] = deque()
+        self.uses: dict[str, int] = {}
+        self.background: set[asyncio.Task] = set()
+        self.reaper = None
+        self.created = 0
+        self.deleted = 0
+        self.leases = 0
+
+    def url(self, session_id: str) -> str:
+        return f"/apps/{self.app_name}/users/{self.user_id}/sessions/{session_id}"
+
+    async def create(self) -> str:
+        session_id = uuid.uuid4().hex
+        r = await self.client.post(self.url(session_id))
+        r.raise_for_status()
+        self.created += 1
+        return session_id
+
+    async def delete(self, session_id: str):
+        try:
+            r = await self.client.delete(self.url(session_id))
+            r.raise_for_status()
+            self.deleted += 1
+        except Exception as e:
+            print(f"Не удалось удалить сессию {session_id}: {e}")
+
+    async def warm(self):
+        session_ids = await asyncio.gather(*[self.create() for _ in range(self.min_size - len(self.idle))])
+        now = time.monotonic()
+        self.idle.extend((session_id, 0, now) for session_id in session_ids)
+        self.start_reaper()
+
+    async def lease(self) -> str:
+        self.start_reaper()
+        self.leases += 1
+        if self.idle:
+            session_id, uses, _ = self.idle.pop()
+        else:
+            session_id, uses = await self.create(), 0
+        self.uses[session_id] = uses
+        return session_id
+
+    def release(self, session_id: str, healthy: bool = True):
+        uses = self.uses.pop(session_id, 0) + 1
+        if healthy and uses < self.max_uses and len(self.idle) < self.max_idle:
+            self.idle.append((session_id, uses, time.monotonic()))
+        else:
+            # сессия могла остаться посреди /run на стороне ADK - в пул её не возвращаем
+            self.in_background(self.delete(session_id))
+
+    @asynccontextmanager
+    async def session(self):
+        session_id = await self.lease()
+        healthy = False
+        try:
+            yield session_id
+            healthy = True
+        finally:
+            self.release(session_id, healthy)
+
+    def in_background(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+
+    def start_reaper(self):
+        if self.reaper is None or self.reaper.done():
+            self.reaper = asyncio.get_running_loop().create_task(self.reap())
+
+    async def reap(self):
+        while True:
+            await asyncio.sleep(self.idle_timeout / 2)
+            deadline = time.monotonic() - self.idle_timeout
+            # самые давние сессии лежат в начале очереди: lease берёт с конца
+            while len(self.idle) > self.min_size and self.idle[0][2] < deadline:
+                session_id, _, _ = self.idle.popleft()
+                await self.delete(session_id)
+
+    def stats(self) -> dict:
+        return {"idle": len(self.idle), "leased": len(self.uses), "created": self.created,
+                "deleted": self.deleted, "leases": self.leases}
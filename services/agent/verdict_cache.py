@@ -0,0 +1,94 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+def jobpost_hash(jobpost: str) -> str:
+    # регистр и пробелы не меняют смысл вакансии
+    return hashlib.sha256(" ".join(jobpost.lower().split()).encode("utf-8")).hexdigest()
+
+
+def candidate_key(candidate: dict) -> tuple[int, str]:
+    return candidate["id"], candidate.get("revision_date") or ""
+
+
+class VerdictCache:
+    """LLM match verdicts for (jobpost, candidate id, resume revision), persisted in SQLite.
+
+    Entries expire after `ttl` seconds; when there are more than `max_entries`,
+    the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, max_entries: int = 100_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # методы вызываются из потоков asyncio.to_thread, а соединение и счётчики у кэша одни
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS verdicts (
+                jobpost_hash TEXT NOT NULL,
+                candidate_id INTEGER NOT NULL,
+                revision TEXT NOT NULL,
+                verdict TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (jobpost_hash, candidate_id, revision)
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)")
+        self.conn.commit()
+
+    def get_many(self, jobpost: str, candidates: list[dict]) -> dict[int, dict]:
+        """Cached verdicts by candidate id; candidates without a fresh verdict are counted as misses."""
+        key = jobpost_hash(jobpost)
+        now = time.time()
+        found = {}
+        with self.lock:
+            for candidate in candidates:
+                candidate_id, revision = candidate_key(candidate)
+                row = self.conn.execute(
+                    "SELECT verdict FROM verdicts WHERE jobpost_hash = ? AND candidate_id = ? AND revision = ? AND created_at > ?",
+                    (key, candidate_id, revision, now - self.ttl)).fetchone()
+                if row is None:
+                    continue
+                found[candidate_id] = json.loads(row[0])
+                self.conn.execute(
+                    "UPDATE verdicts SET last_used = ? WHERE jobpost_hash = ? AND candidate_id = ? AND revision = ?",
+                    (now, key, candidate_id, revision))
+            self.conn.commit()
+            self.hits += len(found)
+            self.misses += len(candidates) - len(found)
+        return found
+
+    def put_many(self, jobpost: str, verdicts: list[tuple[dict, dict]]):
+        key = jobpost_hash(jobpost)
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, *candidate_key(candidate), json.dumps(verdict), now, now) for candidate, verdict in verdicts])
+            self.evict(now)
+            self.conn.commit()
+
+    def evict(self, now: Optional[float] = None):
+        now = now or time.time()
+        self.conn.execute("DELETE FROM verdicts WHERE created_at <= ?", (now - self.ttl,))
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM verdicts WHERE rowid IN (SELECT rowid FROM verdicts ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,))
+
+    def stats(self) -> dict:
+        with self.lock:
+            (size,) = self.conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {"hits": hits, "misses": misses, "size": size,
+                "hit_rate": hits / lookups if lookups else 0.0}
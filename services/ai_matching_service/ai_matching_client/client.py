@@ -2,6 +2,7 @@ import httpx
 import numpy as np
 import asyncio
 from models.candidate_resume import Resume
+from models.codec import json_body, loads
 
 class AIMatching_service_client:
     def __init__(self, base_url: str):
@@ -10,12 +11,50 @@ class AIMatching_service_client:
 
     async def add_candidates(self, candidates: list[dict]): 
     
-        r = await self.client.post(f"{self.base_url}/add_candidates", json=candidates)
+        r = await self.client.post(f"{self.base_url}/add_candidates", **json_body(candidates))
         r.raise_for_status()
-        return {"status" : "OK"}
+        return {"status" : "OK", **loads(r.content)}
     
-    async def start_search_top_candidates(self, jobpost : str, number_of_candidates: int):
-        await self.client.get(f"{self.base_url}/start_search_candidates", params={"jobpost": jobpost, "number_of_candidates" : number_of_candidates})
+    async def start_search_top_candidates(self, jobpost : str, number_of_candidates: int, top_n: int = None, retrieval: str = None):
+        params = {"jobpost": jobpost, "number_of_candidates" : number_of_candidates}
+        if top_n is not None:
+            params["top_n"] = top_n
+        if retrieval is not None:
+            params["retrieval"] = retrieval
+        await self.client.get(f"{self.base_url}/start_search_candidates", params=params)
         return {"status" : "OK"}
 
-    
+    async def stream_search_top_candidates(self, jobpost : str, number_of_candidates: int, **params):
+        """Yields (event, data) from /start_search_candidates/stream: one "batch" per finished batch, then "summary"."""
+        params.update({"jobpost": jobpost, "number_of_candidates" : number_of_candidates})
+        async with self.client.stream("GET", f"{self.base_url}/start_search_candidates/stream", params=params) as r:
+            r.raise_for_status()
+            event = None
+            async for line in r.aiter_lines():
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    yield event, loads(line[len("data:"):].strip())
+
+    async def submit_search(self, jobpost : str, number_of_candidates: int, **params) -> dict:
+        """Starts a background search; returns its progress with "id" right away."""
+        params.update({"jobpost": jobpost, "number_of_candidates" : number_of_candidates})
+        r = await self.client.post(f"{self.base_url}/searches", params=params)
+        r.raise_for_status()
+        return loads(r.content)
+
+    async def get_search(self, search_id: str) -> dict:
+        r = await self.client.get(f"{self.base_url}/searches/{search_id}")
+        r.raise_for_status()
+        return loads(r.content)
+
+    async def get_search_results(self, search_id: str, offset: int = 0, wait: float = 0) -> dict:
+        """Progress plus candidates found after `offset`; with wait > 0 the server holds the request until there is news."""
+        r = await self.client.get(f"{self.base_url}/searches/{search_id}/results", params={"offset": offset, "wait": wait})
+        r.raise_for_status()
+        return loads(r.content)
+
+    async def cancel_search(self, search_id: str) -> dict:
+        r = await self.client.delete(f"{self.base_url}/searches/{search_id}")
+        r.raise_for_status()
+        return loads(r.content)
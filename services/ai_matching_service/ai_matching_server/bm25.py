@@ -0,0 +1,75 @@
+import heapq
+import math
+import re
+from collections import Counter
+
+TOKEN = re.compile(r"\w[\w+#]*(?:\.\w+)*")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN.findall(text.lower())
+
+
+def resume_text(candidate: dict) -> str:
+    """Match-relevant text of a resume: headline, summary, skills and positions."""
+    parts = [candidate.get("headline") or "", candidate.get("summary") or ""]
+    parts += candidate.get("skills") or []
+    for position in candidate.get("work_experience") or []:
+        parts.append(position.get("position_title") or "")
+        parts.append(position.get("company_name") or "")
+    return " ".join(parts)
+
+
+class BM25Index:
+    """Okapi BM25 over resume text, updated in place as candidates are added, replaced or evicted."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, dict[int, int]] = {}
+        self.doc_terms: dict[int, Counter] = {}
+        self.lengths: dict[int, int] = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def add(self, doc_id: int, text: str):
+        self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        self.doc_terms[doc_id] = terms
+        self.lengths[doc_id] = sum(terms.values())
+        self.total_length += self.lengths[doc_id]
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, doc_id: int):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.lengths.pop(doc_id)
+        for term in terms:
+            posting = self.postings[term]
+            del posting[doc_id]
+            if not posting:
+                del self.postings[term]
+
+    def scores(self, query: str) -> dict[int, float]:
+        n = len(self.doc_terms)
+        if n == 0:
+            return {}
+        average_length = self.total_length / n
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, top_n: int) -> list[tuple[int, float]]:
+        """Top-n (doc_id, score) pairs with a positive score, best first."""
+        return heapq.nlargest(top_n, self.scores(query).items(), key=lambda item: item[1])
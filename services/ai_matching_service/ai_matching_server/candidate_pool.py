@@ -0,0 +1,203 @@
+import sqlite3
+from collections import OrderedDict
+from typing import Optional
+from models.codec import dumps_str, loads
+
+
+class CandidatePool:
+    """Candidates keyed by their ATS id.
+
+    Adding a candidate that is already in the pool replaces it (upsert) and moves
+    it to the end, so iteration goes from the least recently added candidate to
+    the most recent one. When `max_size` is set, the oldest candidates are evicted.
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        self.max_size = max_size
+        self.candidates: OrderedDict[int, dict] = OrderedDict()
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def __contains__(self, candidate_id):
+        return candidate_id in self.candidates
+
+    def get(self, candidate_id: int) -> Optional[dict]:
+        return self.candidates.get(candidate_id)
+
+    def values(self) -> list[dict]:
+        return list(self.candidates.values())
+
+    def upsert(self, candidates: list[dict]) -> dict:
+        added, updated = [], []
+        for candidate in candidates:
+            candidate_id = candidate["id"]
+            if candidate_id in self.candidates:
+                updated.append(candidate_id)
+                self.candidates.move_to_end(candidate_id)
+            else:
+                added.append(candidate_id)
+            self.candidates[candidate_id] = candidate
+
+        evicted = []
+        while self.max_size is not None and len(self.candidates) > self.max_size:
+            candidate_id, _ = self.candidates.popitem(last=False)
+            evicted.append(candidate_id)
+
+        return {"added": added, "updated": updated, "evicted": evicted}
+
+    def remove(self, candidate_ids: list[int]) -> list[int]:
+        return [candidate_id for candidate_id in candidate_ids if self.candidates.pop(candidate_id, None) is not None]
+
+
+class PersistentCandidatePool(CandidatePool):
+    """CandidatePool persisted in SQLite (WAL) and shared by every worker that opens the same file.
+
+    Writes go to SQLite in one transaction per call and are recorded in a change log
+    with a global sequence number. Reads are served from the in-process OrderedDict,
+    which `sync()` brings up to date by replaying the log after the last applied
+    sequence number - including changes made by other workers. A worker that fell
+    behind the trimmed log reloads the whole pool.
+
+    `write()` and `read_changes()` only touch SQLite and `apply()` only touches the
+    cache, so an asyncio caller can run the first two in a thread and apply the
+    result on the event loop.
+    """
+
+    def __init__(self, path: str, max_size: Optional[int] = None, max_changes: int = 100_000):
+        super().__init__(max_size)
+        self.path = path
+        self.max_changes = max_changes
+        self.seq = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS candidates (
+                id INTEGER PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                resume TEXT NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS candidates_seq ON candidates (seq)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY,
+                candidate_id INTEGER NOT NULL,
+                op TEXT NOT NULL
+            )""")
+        self.reload()
+
+    def last_seq(self) -> int:
+        (seq,) = self.conn.execute("SELECT MAX(seq) FROM changes").fetchone()
+        return seq or 0
+
+    def reload(self) -> dict:
+        """Replaces the cache with the whole table; returns the difference as upsert() does."""
+        return self.apply(self.read_all())
+
+    def read_all(self) -> dict:
+        seq = self.last_seq()
+        rows = self.conn.execute("SELECT id, resume FROM candidates ORDER BY seq").fetchall()
+        return {"reload": OrderedDict((candidate_id, loads(resume)) for candidate_id, resume in rows), "seq": seq}
+
+    def write(self, upserts: list[dict], removals: list[int]) -> dict[int, dict]:
+        """Writes in one transaction; returns the written candidates by their change seq."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq = self.last_seq()
+            log = []
+            rows = []
+            for candidate in upserts:
+                seq += 1
+                rows.append((seq, candidate["id"], dumps_str(candidate)))
+                log.append((seq, candidate["id"], "upsert"))
+            self.conn.executemany(
+                "INSERT INTO candidates (seq, id, resume) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET seq = excluded.seq, resume = excluded.resume", rows)
+            self.conn.executemany("DELETE FROM candidates WHERE id = ?", [(candidate_id,) for candidate_id in removals])
+            if self.max_size is not None:
+                (count,) = self.conn.execute("SELECT COUNT(*) FROM candidates").fetchone()
+                evicted = [candidate_id for (candidate_id,) in self.conn.execute(
+                    "SELECT id FROM candidates ORDER BY seq LIMIT ?", (max(0, count - self.max_size),))]
+                self.conn.executemany("DELETE FROM candidates WHERE id = ?", [(candidate_id,) for candidate_id in evicted])
+                removals = removals + evicted
+            for candidate_id in removals:
+                seq += 1
+                log.append((seq, candidate_id, "remove"))
+            self.conn.executemany("INSERT INTO changes (seq, candidate_id, op) VALUES (?, ?, ?)", log)
+            self.conn.execute("DELETE FROM changes WHERE seq <= ?", (seq - self.max_changes,))
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return {row_seq: candidate for (row_seq, _, _), candidate in zip(rows, upserts)}
+
+    def read_changes(self, written: Optional[dict[int, dict]] = None) -> dict:
+        """Reads the changes made since the last sync (by any worker) without touching the cache.
+
+        Only SQLite is accessed, so it can run in a worker thread; `apply()` then updates
+        the cache. `written` - this worker's own writes by seq, they are not read back from SQLite.
+        """
+        written = written or {}
+        (first,) = self.conn.execute("SELECT MIN(seq) FROM changes").fetchone()
+        if first is not None and first > self.seq + 1:
+            return self.read_all()
+        rows = self.conn.execute("SELECT seq, candidate_id, op FROM changes WHERE seq > ? ORDER BY seq",
+                                 (self.seq,)).fetchall()
+        if not rows:
+            return {"ops": {}, "resumes": {}, "seq": self.seq}
+        # повторные изменения одного кандидата схлопываются в последнее
+        last_op = {}
+        for seq, candidate_id, op in rows:
+            last_op.pop(candidate_id, None)
+            last_op[candidate_id] = (seq, op)
+        resumes = {candidate_id: written[seq] for candidate_id, (seq, op) in last_op.items()
+                   if op == "upsert" and seq in written}
+        upserted = [candidate_id for candidate_id, (seq, op) in last_op.items()
+                    if op == "upsert" and candidate_id not in resumes]
+        for start in range(0, len(upserted), 500):
+            chunk = upserted[start:start + 500]
+            resumes.update((candidate_id, loads(resume)) for candidate_id, resume in self.conn.execute(
+                f"SELECT id, resume FROM candidates WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+        return {"ops": last_op, "resumes": resumes, "seq": rows[-1][0]}
+
+    def apply(self, changes: dict) -> dict:
+        """Applies the result of read_changes() or read_all() to the cache; returns the difference as upsert() does."""
+        if "reload" in changes:
+            candidates = changes["reload"]
+            diff = {"added": [candidate_id for candidate_id in candidates if candidate_id not in self.candidates],
+                    "updated": [candidate_id for candidate_id in candidates if candidate_id in self.candidates],
+                    "evicted": [candidate_id for candidate_id in self.candidates if candidate_id not in candidates]}
+            self.candidates, self.seq = candidates, changes["seq"]
+            return diff
+
+        added, updated, evicted = [], [], []
+        for candidate_id in changes["ops"]:
+            candidate = changes["resumes"].get(candidate_id)
+            if candidate is None:
+                if self.candidates.pop(candidate_id, None) is not None:
+                    evicted.append(candidate_id)
+            elif candidate_id in self.candidates:
+                updated.append(candidate_id)
+                self.candidates.move_to_end(candidate_id)
+                self.candidates[candidate_id] = candidate
+            else:
+                added.append(candidate_id)
+                self.candidates[candidate_id] = candidate
+        self.seq = changes["seq"]
+        return {"added": added, "updated": updated, "evicted": evicted}
+
+    def sync(self, written: Optional[dict[int, dict]] = None) -> dict:
+        """Applies changes made since the last sync (by any worker) to the cache."""
+        return self.apply(self.read_changes(written))
+
+    def upsert(self, candidates: list[dict]) -> dict:
+        return self.sync(self.write(candidates, []))
+
+    def remove(self, candidate_ids: list[int]) -> list[int]:
+        self.write([], [candidate_id for candidate_id in candidate_ids if candidate_id in self.candidates])
+        return self.sync()["evicted"]
+
+    def stats(self) -> dict:
+        return {"size": len(self.candidates), "seq": self.seq, "path": self.path, "max_size": self.max_size}
@@ -0,0 +1,97 @@
+import zlib
+from typing import Optional
+import numpy as np
+from .bm25 import tokenize
+
+
+class HashingEmbedder:
+    """Offline text embedding: signed feature hashing of words and word bigrams, then a fixed random projection.
+
+    Hashes use crc32, so every process (and every restart) produces the same vectors.
+    """
+
+    def __init__(self, n_features: int = 2 ** 14, dim: int = 256, seed: int = 42):
+        self.n_features = n_features
+        self.dim = dim
+        rng = np.random.default_rng(seed)
+        self.projection = rng.standard_normal((n_features, dim), dtype=np.float32) / np.sqrt(dim)
+
+    def features(self, text: str) -> dict[int, float]:
+        tokens = tokenize(text)
+        counts: dict[int, float] = {}
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            h = zlib.crc32(feature.encode("utf-8"))
+            bucket = h % self.n_features
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            counts[bucket] = counts.get(bucket, 0.0) + sign
+        return counts
+
+    def embed(self, text: str) -> np.ndarray:
+        counts = self.features(text)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if counts:
+            buckets = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            # сублинейный tf, чтобы длинные резюме не перетягивали на себя повторами
+            values = np.sign(values) * np.log1p(np.abs(values))
+            vector = values @ self.projection[buckets]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+
+class EmbeddingIndex:
+    """Resume vectors in one contiguous float32 matrix.
+
+    Appends grow the matrix by doubling, replacements overwrite the row in place and
+    removed rows are reused, so the index is never rebuilt. Scoring the whole pool
+    is one matrix-vector product followed by argpartition.
+    """
+
+    def __init__(self, embedder: Optional[HashingEmbedder] = None, capacity: int = 1024):
+        self.embedder = embedder or HashingEmbedder()
+        self.matrix = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        self.row_ids = np.full(capacity, -1, dtype=np.int64)
+        self.rows: dict[int, int] = {}
+        self.free_rows: list[int] = []
+        self.size = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, doc_id: int, text: str):
+        row = self.rows.get(doc_id)
+        if row is None:
+            row = self.free_rows.pop() if self.free_rows else self.next_row()
+            self.rows[doc_id] = row
+            self.row_ids[row] = doc_id
+        self.matrix[row] = self.embedder.embed(text)
+
+    def next_row(self) -> int:
+        if self.size == len(self.matrix):
+            capacity = 2 * len(self.matrix)
+            matrix = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+            matrix[:self.size] = self.matrix[:self.size]
+            row_ids = np.full(capacity, -1, dtype=np.int64)
+            row_ids[:self.size] = self.row_ids[:self.size]
+            self.matrix, self.row_ids = matrix, row_ids
+        self.size += 1
+        return self.size - 1
+
+    def remove(self, doc_id: int):
+        row = self.rows.pop(doc_id, None)
+        if row is None:
+            return
+        self.matrix[row] = 0
+        self.row_ids[row] = -1
+        self.free_rows.append(row)
+
+    def search(self, query: str, top_n: int) -> list[tuple[int, float]]:
+        """Top-n (doc_id, cosine similarity) pairs, best first."""
+        if not self.rows or top_n <= 0:
+            return []
+        scores = self.matrix[:self.size] @ self.embedder.embed(query)
+        scores[self.row_ids[:self.size] < 0] = -np.inf
+        top_n = min(top_n, len(self.rows))
+        best = np.argpartition(-scores, top_n - 1)[:top_n]
+        best = best[np.argsort(-scores[best])]
+        return [(int(self.row_ids[row]), float(scores[row])) for row in best]
@@ -0,0 +1,104 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+
+class SearchJob:
+    """One background search: progress counters, candidates found so far and the task running it."""
+
+    def __init__(self, request: dict):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.status = "running"
+        self.batches_done = 0
+        self.batches_total: Optional[int] = None
+        self.input_tokens: Optional[int] = None
+        self.input_tokens_saved: Optional[int] = None
+        self.candidates: list[dict] = []
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status != "running"
+
+    def plan(self, plan: dict):
+        self.batches_total = plan["batches_total"]
+        self.input_tokens = plan["input_tokens"]
+        self.input_tokens_saved = plan["input_tokens_saved"]
+        self.notify()
+
+    def add_batch(self, batch: dict):
+        self.batches_done += 1
+        self.candidates.extend(batch["result"] or [])
+        self.notify()
+
+    def finish(self, status: str, error: Optional[str] = None):
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        self.notify()
+
+    def notify(self):
+        # будим всех, кто ждёт новых кандидатов, и сразу готовим событие для следующих
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def progress(self) -> dict:
+        return {"id": self.id, "status": self.status, "batches_done": self.batches_done,
+                "batches_total": self.batches_total, "candidates_found": len(self.candidates),
+                "input_tokens": self.input_tokens, "input_tokens_saved": self.input_tokens_saved,
+                "error": self.error, "created_at": self.created_at, "finished_at": self.finished_at}
+
+
+class SearchJobRegistry:
+    """Search jobs in memory. Above `max_jobs` the oldest finished jobs are evicted; running jobs are never dropped."""
+
+    def __init__(self, max_jobs: int = 256):
+        self.max_jobs = max_jobs
+        self.jobs: OrderedDict[str, SearchJob] = OrderedDict()
+
+    def get(self, job_id: str) -> Optional[SearchJob]:
+        return self.jobs.get(job_id)
+
+    def submit(self, request: dict, start) -> SearchJob:
+        """Starts a job; `start(job)` returns an async iterator of {"result": ...} per batch."""
+        job = SearchJob(request)
+        self.jobs[job.id] = job
+        job.task = asyncio.get_running_loop().create_task(self.run(job, start(job)))
+        self.evict()
+        return job
+
+    async def run(self, job: SearchJob, batches):
+        try:
+            async for batch in batches:
+                job.add_batch(batch)
+            job.finish("completed")
+        except asyncio.CancelledError:
+            job.finish("cancelled")
+        except Exception as e:
+            print(f"Поиск {job.id} упал: {e!r}")
+            job.finish("failed", error=repr(e))
+        finally:
+            await batches.aclose()
+            self.evict()
+
+    def cancel(self, job_id: str) -> Optional[SearchJob]:
+        job = self.jobs.get(job_id)
+        if job is not None and not job.finished:
+            job.task.cancel()
+        return job
+
+    def evict(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+            del self.jobs[job_id]
+
+    def stats(self) -> dict:
+        running = sum(1 for job in self.jobs.values() if not job.finished)
+        return {"jobs": len(self.jobs), "running": running, "max_jobs": self.max_jobs}
@@ -1,41 +1,248 @@
-from fastapi import FastAPI
-from ...agent.session import searching_of_candidates
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from ...agent.session import iter_searching_of_candidates, iter_ranked_candidates, verdict_cache, batch_planner, session_pool, llm_governor
+from contextlib import asynccontextmanager
+from .candidate_pool import PersistentCandidatePool
+from .bm25 import BM25Index, resume_text
+from .embedding_index import EmbeddingIndex
+from .search_jobs import SearchJobRegistry
+from models.codec import FastJSONResponse, dumps_str, loads
+from pathlib import Path
+from typing import Optional, Literal
 import asyncio
-from math import ceil
+import os
+import time
 import uvicorn
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # пул уже поднят из SQLite - индексы строятся из него, без повторной загрузки из ATS
+    started = time.monotonic()
+    index_changes({"added": [candidate["id"] for candidate in pool.values()], "updated": [], "evicted": []})
+    print(f"Пул кандидатов: {len(pool)} из {pool.path}, индексы построены за {time.monotonic() - started:.2f} с")
+    try:
+        await session_pool.warm()
+    except Exception as e:
+        print(f"Не удалось прогреть пул сессий ADK: {e}")
+    yield
+
  
-app = FastAPI()
-memory = {"list_of_candidates": []}
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+# Пул без дубликатов: ключ - id резюме в ATS, самые старые кандидаты вытесняются при переполнении.
+# Хранится в SQLite и переживает перезапуск; несколько воркеров uvicorn делят один файл
+pool = PersistentCandidatePool(os.environ.get("AI_MATCHING_POOL_DB", str(Path(__file__).parent / "candidate_pool.sqlite3")),
+                               max_size=int(os.environ["AI_MATCHING_POOL_SIZE"]) if os.environ.get("AI_MATCHING_POOL_SIZE") else None)
+# Лексический индекс перед LLM: в агента уходят только top_n кандидатов по BM25
+lexical_index = BM25Index()
+# Плотный индекс на локальных эмбеддингах (hashing + random projection), работает без сети
+dense_index = EmbeddingIndex()
+DEFAULT_TOP_N = int(os.environ.get("AI_MATCHING_TOP_N", 50))
+DEFAULT_RETRIEVAL = os.environ.get("AI_MATCHING_RETRIEVAL", "bm25")
+# topk - лучшие по баллу LLM среди всех батчей, first - первые найденные в порядке готовности батчей
+DEFAULT_RANKING = os.environ.get("AI_MATCHING_RANKING", "first")
+RRF_K = 60
+# Фоновые поиски: /searches сразу отдаёт id задачи, завершённые задачи вытесняются сверх лимита
+search_jobs = SearchJobRegistry(max_jobs=int(os.environ.get("AI_MATCHING_MAX_JOBS", 256)))
 status = {}
-index = 0
-lock = asyncio.Lock()
+# SQLite пула читается и пишется в потоке: пока другой воркер держит файл (busy_timeout до 5 с), event loop
+# продолжает обслуживать поиски и SSE. Кэш пула и индексы меняются уже в event loop, по одному обновлению за раз
+pool_lock = asyncio.Lock()
+
+
+def index_changes(changes: dict):
+    for candidate_id in changes["added"] + changes["updated"]:
+        candidate = pool.get(candidate_id)
+        if candidate is not None:
+            text = resume_text(candidate)
+            lexical_index.add(candidate_id, text)
+            dense_index.add(candidate_id, text)
+    for candidate_id in changes["evicted"]:
+        lexical_index.remove(candidate_id)
+        dense_index.remove(candidate_id)
+
+
+async def add_to_pool(candidates: list[dict]) -> dict:
+    async with pool_lock:
+        changes = pool.apply(await asyncio.to_thread(lambda: pool.read_changes(pool.write(candidates, []))))
+        index_changes(changes)
+    return changes
+
+
+async def sync_pool():
+    # подтягиваем кандидатов, которых добавили другие воркеры
+    async with pool_lock:
+        index_changes(pool.apply(await asyncio.to_thread(pool.read_changes)))
+
+
+def shortlist(jobpost: str, top_n: int, retrieval: str) -> tuple[list[dict], Optional[dict[int, float]]]:
+    """Candidates in prefilter order and their prefilter scores (None without a prefilter)."""
+    if top_n <= 0 or retrieval == "none":
+        return pool.values(), None
+    if retrieval == "bm25":
+        scores = dict(lexical_index.search(jobpost, top_n))
+    elif retrieval == "dense":
+        scores = dict(dense_index.search(jobpost, top_n))
+    else:
+        # hybrid: reciprocal rank fusion двух списков
+        fused = {}
+        for results in (lexical_index.search(jobpost, top_n), dense_index.search(jobpost, top_n)):
+            for rank, (candidate_id, _) in enumerate(results):
+                fused[candidate_id] = fused.get(candidate_id, 0.0) + 1 / (RRF_K + rank)
+        scores = dict(sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_n])
+    if len(scores) < top_n:
+        # без лексических совпадений (например, вакансия на другом языке) префильтр не должен
+        # оставлять LLM без кандидатов: добираем до top_n остальными резюме пула с нулевым баллом
+        for candidate in pool.values():
+            if len(scores) >= top_n:
+                break
+            scores.setdefault(candidate["id"], 0.0)
+    return [pool.get(candidate_id) for candidate_id in scores], scores
 
 
 @app.post("/add_candidates")
-async def add_candidates(candidates: list[dict]):
-    for candidate in candidates:
-        memory["list_of_candidates"].append(candidate)
+async def add_candidates(request: Request):
+    # тело - JSON-массив резюме; разбираем его сразу кодеком, без промежуточной валидации list[dict]
+    try:
+        candidates = loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid JSON")
+    if not isinstance(candidates, list) or not all(isinstance(candidate, dict) and "id" in candidate
+                                                   for candidate in candidates):
+        raise HTTPException(status_code=422, detail="Expected a JSON array of candidates with an id")
+    changes = await add_to_pool(candidates)
+    return {"added": len(changes["added"]), "updated": len(changes["updated"]), 
+            "evicted": len(changes["evicted"]), "size": len(pool)}
 
 
-@app.get("/start_search_candidates")
-async def search_candidates(jobpost: str, number_of_candidates: int):
+def search_request(jobpost: str, number_of_candidates: int, top_n: Optional[int] = None,
+                   retrieval: Literal["bm25", "dense", "hybrid", "none"] = DEFAULT_RETRIEVAL,
+                   ranking: Literal["topk", "first"] = DEFAULT_RANKING,
+                   token_budget: Optional[int] = None, max_batch_size: Optional[int] = None) -> dict:
+    return {"jobpost": jobpost, "number_of_candidates": number_of_candidates, "top_n": top_n, "retrieval": retrieval,
+            "ranking": ranking, "token_budget": token_budget, "max_batch_size": max_batch_size}
+
 
-    print(f"Запустили поиск кандидатов для резюме {jobpost}")
-    global index
-    num_of_indexes = ceil(len(memory["list_of_candidates"]) / 5) 
-    async with lock:
-        index += (num_of_indexes + 1)
+async def iter_search(request: dict, on_plan=None):
+    print(f"Запустили поиск кандидатов для резюме {request['jobpost']}")
+    await sync_pool()
+    # top_n=0 или retrieval=none отключает префильтр и отправляет в LLM весь пул
+    top_n = DEFAULT_TOP_N if request["top_n"] is None else request["top_n"]
+    candidates, _ = shortlist(request["jobpost"], top_n, request["retrieval"])
+    print(f"Префильтр {request['retrieval']} оставил {len(candidates)} из {len(pool)} кандидатов")
+    if request["ranking"] == "topk":
+        batches = iter_ranked_candidates(request["jobpost"], request["number_of_candidates"], candidates,
+                                         token_budget=request["token_budget"], max_batch_size=request["max_batch_size"],
+                                         on_plan=on_plan)
+    else:
+        batches = iter_searching_of_candidates(request["jobpost"], request["number_of_candidates"], candidates,
+                                               token_budget=request["token_budget"], max_batch_size=request["max_batch_size"],
+                                               on_plan=on_plan)
+    try:
+        async for batch in batches:
+            yield batch
+    finally:
+        # закрываем явно: отмена оставшихся батчей не должна ждать сборщика мусора
+        await batches.aclose()
 
-    start_index = index 
 
-    result = await searching_of_candidates(jobpost, number_of_candidates, memory["list_of_candidates"], start_index)
+@app.get("/start_search_candidates")
+async def search_candidates(request: dict = Depends(search_request)):
+    result = [batch async for batch in iter_search(request)]
     print("Все ок")
     return {"result": result}
-    
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {dumps_str(data)}\n\n"
+
+
+@app.get("/start_search_candidates/stream")
+async def stream_search_candidates(request: dict = Depends(search_request)):
+    # Каждый батч уходит клиенту событием "batch" сразу, как только LLM ответила, в конце - событие "summary"
+    async def events():
+        started = time.monotonic()
+        batches, found = 0, 0
+        plan = {}
+        async for batch in iter_search(request, on_plan=plan.update):
+            batches += 1
+            found += len(batch["result"] or [])
+            yield sse("batch", batch)
+        yield sse("summary", {"batches": batches, "found": found, "seconds": round(time.monotonic() - started, 3),
+                              "input_tokens": plan.get("input_tokens"), "input_tokens_saved": plan.get("input_tokens_saved")})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+def search_job(search_id: str):
+    job = search_jobs.get(search_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Search not found")
+    return job
+
+
+@app.post("/searches", status_code=202)
+async def create_search(request: dict = Depends(search_request)):
+    job = search_jobs.submit(request, lambda job: iter_search(request, on_plan=job.plan))
+    return job.progress()
+
+
+@app.get("/searches")
+async def list_searches():
+    return {"searches": [job.progress() for job in search_jobs.jobs.values()], **search_jobs.stats()}
+
+
+@app.get("/searches/{search_id}")
+async def get_search(search_id: str):
+    return search_job(search_id).progress()
+
+
+@app.get("/searches/{search_id}/results")
+async def get_search_results(search_id: str, offset: int = Query(0, ge=0), wait: float = Query(0, ge=0, le=30)):
+    # wait > 0 - long polling: ждём новых кандидатов или завершения поиска не дольше wait секунд
+    job = search_job(search_id)
+    if wait and len(job.candidates) <= offset and not job.finished:
+        try:
+            await asyncio.wait_for(job.changed.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+    return {**job.progress(), "candidates": job.candidates[offset:], "next_offset": len(job.candidates)}
+
+
+@app.delete("/searches/{search_id}")
+async def cancel_search(search_id: str):
+    search_job(search_id)
+    job = search_jobs.cancel(search_id)
+    if job.task is not None:
+        await asyncio.wait([job.task])
+    return job.progress()
+
+
+@app.get("/verdict_cache/stats")
+async def verdict_cache_stats():
+    return await asyncio.to_thread(verdict_cache.stats)
+
+@app.get("/batch_planner/stats")
+async def batch_planner_stats():
+    return batch_planner.stats()
+
+@app.get("/session_pool/stats")
+async def session_pool_stats():
+    return session_pool.stats()
+
+@app.get("/llm_governor/stats")
+async def llm_governor_stats():
+    # queue_depth - сколько батчей всех поисков ждут очереди к LLM, wait_seconds_* - сколько они ждут
+    return llm_governor.stats()
+
+@app.get("/pool/stats")
+async def pool_stats():
+    return pool.stats()
+
 @app.get("/get_memory")
 async def search_candidates():
-         return memory
+         await sync_pool()
+         return {"list_of_candidates": pool.values()}
 
 
 if __name__ == "__main__":
@@ -1,21 +1,57 @@
 import httpx
 import asyncio
+from models.codec import loads
 
 class ATSClient():
     
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, timeout = 5.0):
         self.base_url = base_url
-        self.client = httpx.AsyncClient(base_url=base_url)
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=timeout)
 
     async def get_candidates(self, number_of_resumes = 5):
 
         r = await self.client.get("/get_candidates", params={"number_of_resumes": number_of_resumes})
-        return r.json()
+        return loads(r.content)
+
+    async def iter_pages(self, number_of_resumes: int, page_size = 500, filters: dict = None, cursor: str = None):
+        """Yields (NDJSON lines, next cursor) per page of /candidates/stream; the cursor is None after the last page.
+
+        Lines are yielded as received, so a caller that only forwards resumes never parses them;
+        passing a saved cursor back continues the same sample.
+        """
+        remaining = number_of_resumes
+        while remaining > 0:
+            params = {"page_size": min(remaining, page_size), **(filters or {})}
+            if cursor:
+                params["cursor"] = cursor
+            async with self.client.stream("GET", "/candidates/stream", params=params) as r:
+                r.raise_for_status()
+                cursor = r.headers.get("X-Next-Cursor")
+                lines = [line async for line in r.aiter_lines() if line]
+            remaining -= len(lines)
+            yield lines, cursor
+            if not cursor:
+                break
+
+    async def stream_candidates(self, number_of_resumes: int, page_size = 500, filters: dict = None):
+        """Yields pages of resumes from /candidates/stream until enough are pulled or the pool is exhausted."""
+        async for lines, _ in self.iter_pages(number_of_resumes, page_size, filters):
+            yield [loads(line) for line in lines]
+
+    async def get_changes(self, since: str = None, limit = 500):
+        """Resumes revised after the watermark; persist the returned "watermark" and pass it back as `since`."""
+        params = {"limit": limit}
+        if since:
+            params["since"] = since
+        r = await self.client.get("/changes", params=params)
+        r.raise_for_status()
+        return loads(r.content)
 
 async def main():
     ats = ATSClient("http://0.0.0.0:80")
 
-asyncio.run(main())
+if __name__ == "__main__":
+    asyncio.run(main())
 
 
     
@@ -0,0 +1,154 @@
+"""Columnar resume file for the ATS mock.
+
+Layout: MAGIC, uint64 header size, JSON header with the column directory, then
+8-byte aligned little-endian arrays. Every column is a plain array, so a file
+opened with mmap is shared between ATS workers through the page cache and
+nothing is parsed until a row is actually returned.
+
+Columns:
+    id                          int64[n]
+    json.offsets / json.data    pre-serialized resume per row
+    <category>.*                location, headline, revision_date: string table + uint32 code per row
+    <multi>.*                   skills, languages: string table + per-row offsets into uint32 codes
+
+Usage:
+    python -m services.atsservice.ats_server.columnar new_can.json resumes.col
+"""
+import argparse
+import io
+import json
+import struct
+from pathlib import Path
+import numpy as np
+
+MAGIC = b"ATSCOL01"
+ALIGN = 8
+
+CATEGORY_FIELDS = ("location", "headline", "revision_date")
+MULTI_CATEGORY_FIELDS = ("skills", "languages")
+
+
+class StringTable:
+    """Strings stored as one utf-8 blob plus an offsets array."""
+
+    def __init__(self, offsets: np.ndarray, data: memoryview):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, i: int) -> memoryview:
+        return self.data[int(self.offsets[i]):int(self.offsets[i + 1])]
+
+    def __getitem__(self, i: int) -> str:
+        return str(self.raw(i), "utf-8")
+
+    def values(self) -> list[str]:
+        return [self[i] for i in range(len(self))]
+
+
+def encode_strings(values) -> tuple[np.ndarray, np.ndarray]:
+    blob = io.BytesIO()
+    offsets = [0]
+    for value in values:
+        blob.write(value if isinstance(value, bytes) else value.encode("utf-8"))
+        offsets.append(blob.tell())
+    return np.array(offsets, dtype="<u8"), np.frombuffer(blob.getvalue(), dtype=np.uint8)
+
+
+def iter_resumes(path):
+    """Resumes from a `{"list_of_resumes": [...]}` / plain list JSON file or from a JSONL dump."""
+    path = Path(path)
+    with open(path, "r", encoding="utf-8") as f:
+        if path.suffix == ".jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        data = json.load(f)
+    yield from data["list_of_resumes"] if isinstance(data, dict) else data
+
+
+def build_columns(resumes) -> dict[str, np.ndarray]:
+    ids = []
+    fragments = []
+    categories = {field: {} for field in CATEGORY_FIELDS}
+    category_codes = {field: [] for field in CATEGORY_FIELDS}
+    multi = {field: {} for field in MULTI_CATEGORY_FIELDS}
+    multi_codes = {field: [] for field in MULTI_CATEGORY_FIELDS}
+    multi_offsets = {field: [0] for field in MULTI_CATEGORY_FIELDS}
+
+    for resume in resumes:
+        ids.append(resume["id"])
+        fragments.append(json.dumps(resume, ensure_ascii=False).encode("utf-8"))
+        for field in CATEGORY_FIELDS:
+            table = categories[field]
+            category_codes[field].append(table.setdefault(resume.get(field) or "", len(table)))
+        for field in MULTI_CATEGORY_FIELDS:
+            table = multi[field]
+            values = resume.get(field) or []
+            multi_codes[field].extend(table.setdefault(value, len(table)) for value in values)
+            multi_offsets[field].append(multi_offsets[field][-1] + len(values))
+
+    columns = {"id": np.array(ids, dtype="<i8")}
+    columns["json.offsets"], columns["json.data"] = encode_strings(fragments)
+    for field in CATEGORY_FIELDS:
+        columns[f"{field}.table.offsets"], columns[f"{field}.table.data"] = encode_strings(categories[field])
+        columns[f"{field}.codes"] = np.array(category_codes[field], dtype="<u4")
+    for field in MULTI_CATEGORY_FIELDS:
+        columns[f"{field}.table.offsets"], columns[f"{field}.table.data"] = encode_strings(multi[field])
+        columns[f"{field}.row_offsets"] = np.array(multi_offsets[field], dtype="<u8")
+        columns[f"{field}.codes"] = np.array(multi_codes[field], dtype="<u4")
+    return columns
+
+
+def write_columns(columns: dict[str, np.ndarray], f):
+    directory = {}
+    offset = 0
+    for name, array in columns.items():
+        directory[name] = {"offset": offset, "count": len(array), "dtype": array.dtype.str}
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+
+    header = json.dumps({"rows": len(columns["id"]), "columns": directory}).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + 8 + len(header)) % ALIGN)
+    f.write(MAGIC)
+    f.write(struct.pack("<Q", len(header)))
+    f.write(header)
+    for array in columns.values():
+        f.write(array.tobytes())
+        f.write(b"\0" * (-array.nbytes % ALIGN))
+
+
+def read_columns(buffer) -> tuple[int, dict[str, np.ndarray], dict[str, memoryview]]:
+    """Zero-copy views over a columnar buffer (bytes or mmap): numpy arrays and raw memoryviews."""
+    view = memoryview(buffer)
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a columnar resume file")
+    (header_size,) = struct.unpack_from("<Q", view, len(MAGIC))
+    base = len(MAGIC) + 8 + header_size
+    header = json.loads(bytes(view[len(MAGIC) + 8:base]))
+
+    arrays, raw = {}, {}
+    for name, column in header["columns"].items():
+        dtype = np.dtype(column["dtype"])
+        start = base + column["offset"]
+        arrays[name] = np.frombuffer(view, dtype=dtype, count=column["count"], offset=start)
+        raw[name] = view[start:start + column["count"] * dtype.itemsize]
+    return header["rows"], arrays, raw
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a resume JSON/JSONL dump into a columnar ATS store")
+    parser.add_argument("source", help="new_can.json, candidates_2.json or any JSONL dump")
+    parser.add_argument("target", help="output .col file")
+    args = parser.parse_args()
+
+    columns = build_columns(iter_resumes(args.source))
+    with open(args.target, "wb") as f:
+        write_columns(columns, f)
+    print(f"Записали {len(columns['id'])} резюме в {args.target}")
+
+
+if __name__ == "__main__":
+    main()
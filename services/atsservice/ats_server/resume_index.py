@@ -0,0 +1,162 @@
+import re
+from typing import Optional
+import numpy as np
+
+WORD = re.compile(r"\w[\w+#.]*")
+LANGUAGE_LEVEL = re.compile(r"\(.*?\)")
+EMPTY = np.empty(0, dtype=np.int32)
+
+
+def normalize_skill(skill: str) -> str:
+    return skill.strip().lower()
+
+
+def normalize_language(language: str) -> str:
+    # "English (C1)" -> "english"
+    return LANGUAGE_LEVEL.sub("", language).strip().lower()
+
+
+def location_terms(location: str) -> list[str]:
+    # "Herford, Germany" -> ["herford", "germany"]
+    return [part.strip().lower() for part in location.split(",") if part.strip()]
+
+
+def headline_terms(headline: str) -> list[str]:
+    return WORD.findall(headline.lower())
+
+
+def intersect_sorted(small: np.ndarray, large: np.ndarray) -> np.ndarray:
+    """Intersection of two sorted unique id arrays in O(len(small) * log(len(large)))."""
+    if len(small) == 0 or len(large) == 0:
+        return EMPTY
+    positions = np.searchsorted(large, small)
+    positions[positions == len(large)] = 0
+    return small[large[positions] == small]
+
+
+def build_postings(table, terms_of, rows: np.ndarray, codes: np.ndarray) -> dict[str, np.ndarray]:
+    """Posting lists from dictionary-encoded (row, code) pairs.
+
+    Only the distinct values of the string table are tokenized; rows are then
+    expanded to terms and grouped with one lexsort, without touching resume dicts.
+    """
+    terms = {}
+    code_terms, code_term_offsets = [], [0]
+    for value in table.values():
+        for term in dict.fromkeys(terms_of(value)):
+            code_terms.append(terms.setdefault(term, len(terms)))
+        code_term_offsets.append(len(code_terms))
+    if not code_terms or len(codes) == 0:
+        return {}
+
+    code_terms = np.array(code_terms, dtype=np.int64)
+    code_term_offsets = np.array(code_term_offsets, dtype=np.int64)
+    counts = np.diff(code_term_offsets)[codes]
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    term_ids = code_terms[np.repeat(code_term_offsets[codes], counts) + within]
+    row_ids = np.repeat(rows, counts)
+
+    order = np.lexsort((row_ids, term_ids))
+    term_ids, row_ids = term_ids[order], row_ids[order]
+    keep = np.ones(len(term_ids), dtype=bool)
+    keep[1:] = (term_ids[1:] != term_ids[:-1]) | (row_ids[1:] != row_ids[:-1])
+    term_ids, row_ids = term_ids[keep], row_ids[keep]
+
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(term_ids)) + 1, [len(term_ids)]))
+    names = list(terms)
+    return {names[term_ids[a]]: row_ids[a:b] for a, b in zip(bounds[:-1], bounds[1:])}
+
+
+class ResumeIndex:
+    """Inverted indexes over skills, languages, location and headline words plus a revision_date order.
+
+    Every posting list is a sorted int32 array of store rows, so a multi-filter query
+    is a chain of sorted-id intersections that starts from the rarest term.
+    """
+
+    def __init__(self, store):
+        n = len(store)
+        rows = np.arange(n, dtype=np.int32)
+        self.postings = {}
+
+        for field, terms_of in (("location", location_terms), ("headline", headline_terms)):
+            table, codes = store.category(field)
+            self.postings[field] = build_postings(table, terms_of, rows, codes)
+
+        for field, terms_of in (("skills", lambda value: [normalize_skill(value)]),
+                                ("languages", lambda value: [normalize_language(value)])):
+            table, row_offsets, codes = store.multi_category(field)
+            self.postings[field] = build_postings(table, terms_of, np.repeat(rows, np.diff(row_offsets).astype(np.int64)), codes)
+
+        table, codes = store.category("revision_date")
+        # dtype=str подбирает ширину по самой длинной дате: ISO datetime не обрезается до дня
+        self.dates = np.array(table.values(), dtype=str)[codes] if n else np.empty(0, dtype=str)
+        # порядок ревизий: (revision_date, id), на нём же стоит лента изменений
+        self.date_order = np.lexsort((store.ids, self.dates)).astype(np.int32)
+        self.sorted_dates = self.dates[self.date_order]
+        self.sorted_ids = store.ids[self.date_order]
+
+    def posting(self, field: str, term: str) -> np.ndarray:
+        return self.postings[field].get(term, EMPTY)
+
+    def date_range(self, date_from: Optional[str], date_to: Optional[str]):
+        # resumes without revision_date are stored as "" and never fall into a range
+        lo = np.searchsorted(self.sorted_dates, date_from or "0", side="left")
+        hi = np.searchsorted(self.sorted_dates, date_to or "9", side="right")
+        return lo, hi
+
+    def query(self, skills: Optional[list[str]] = None, languages: Optional[list[str]] = None,
+              location: Optional[str] = None, headline: Optional[str] = None,
+              revision_date_from: Optional[str] = None, revision_date_to: Optional[str] = None) -> Optional[np.ndarray]:
+        """Sorted rows matching every given filter, or None when no filter is set."""
+        lists = []
+        lists += [self.posting("skills", normalize_skill(skill)) for skill in skills or []]
+        lists += [self.posting("languages", normalize_language(language)) for language in languages or []]
+        lists += [self.posting("location", term) for term in location_terms(location or "")]
+        lists += [self.posting("headline", term) for term in headline_terms(headline or "")]
+        by_date = revision_date_from is not None or revision_date_to is not None
+
+        if not lists and not by_date:
+            return None
+
+        if not lists:
+            lo, hi = self.date_range(revision_date_from, revision_date_to)
+            return np.sort(self.date_order[lo:hi])
+
+        lists.sort(key=len)
+        rows = lists[0]
+        for posting in lists[1:]:
+            if len(rows) == 0:
+                break
+            rows = intersect_sorted(rows, posting)
+
+        if by_date and len(rows):
+            dates = self.dates[rows]
+            mask = dates != ""
+            if revision_date_from is not None:
+                mask &= dates >= revision_date_from
+            if revision_date_to is not None:
+                mask &= dates <= revision_date_to
+            rows = rows[mask]
+        return rows
+
+    def changes_since(self, revision_date: Optional[str], resume_id: Optional[int], limit: int) -> tuple[int, int]:
+        """Positions [start, stop) in `date_order` of rows revised strictly after the (revision_date, id) watermark.
+
+        A page never splits rows that share the same key, so the key of its last row
+        is a safe watermark for the next call.
+        """
+        if revision_date is None:
+            start = 0
+        else:
+            lo = np.searchsorted(self.sorted_dates, revision_date, side="left")
+            hi = np.searchsorted(self.sorted_dates, revision_date, side="right")
+            start = lo + np.searchsorted(self.sorted_ids[lo:hi], resume_id, side="right")
+
+        stop = min(start + limit, len(self.date_order))
+        while 0 < stop < len(self.date_order) and self.key(stop) == self.key(stop - 1):
+            stop += 1
+        return int(start), int(stop)
+
+    def key(self, position: int) -> tuple[str, int]:
+        return str(self.sorted_dates[position]), int(self.sorted_ids[position])
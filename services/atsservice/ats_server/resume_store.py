@@ -0,0 +1,125 @@
+import io
+import json
+import mmap
+import random
+import numpy as np
+from services.atsservice.ats_server.columnar import StringTable, build_columns, iter_resumes, read_columns, write_columns, CATEGORY_FIELDS, MULTI_CATEGORY_FIELDS
+
+
+FEISTEL_ROUNDS = 6
+
+
+class Permutation:
+    """Seeded bijection of range(n) that is evaluated per position instead of being stored.
+
+    A balanced Feistel network keyed by the seed permutes the smallest even-bit
+    domain covering n; positions that land outside range(n) are cycle-walked
+    back into it. It is fully determined by the seed, so a cursor only has to
+    carry the seed and an offset to resume sampling without replacement, and
+    memory stays O(1) whatever the pool size.
+    """
+
+    def __init__(self, seed: int, n: int):
+        self.n = n
+        self.half_bits = max(1, ((n - 1).bit_length() + 1) // 2)
+        self.mask = np.uint64((1 << self.half_bits) - 1)
+        self.keys = np.random.SeedSequence(seed).generate_state(FEISTEL_ROUNDS, dtype=np.uint64)
+
+    def round(self, half: np.ndarray, key: np.uint64) -> np.ndarray:
+        # splitmix64 finalizer; uint64 arithmetic wraps around
+        x = (half ^ key) * np.uint64(0x9E3779B97F4A7C15)
+        x ^= x >> np.uint64(30)
+        x *= np.uint64(0xBF58476D1CE4E5B9)
+        x ^= x >> np.uint64(27)
+        return x & self.mask
+
+    def encrypt(self, x: np.ndarray) -> np.ndarray:
+        bits = np.uint64(self.half_bits)
+        left, right = x >> bits, x & self.mask
+        for key in self.keys:
+            left, right = right, left ^ self.round(right, key)
+        return (left << bits) | right
+
+    def __getitem__(self, positions: slice) -> np.ndarray:
+        x = self.encrypt(np.arange(*positions.indices(self.n), dtype=np.uint64))
+        outside = x >= self.n
+        while outside.any():
+            x[outside] = self.encrypt(x[outside])
+            outside = x >= self.n
+        return x.astype(np.int64)
+
+
+def permutation(seed: int, n: int) -> Permutation:
+    return Permutation(seed, n)
+
+
+class ResumeStore:
+    """Resumes kept in the columnar layout from `columnar.py`, including their pre-serialized JSON.
+
+    Answering a request for k resumes only picks k row indexes and joins k byte
+    fragments straight from the buffer. Resume dicts are materialized lazily,
+    only for the rows that are actually needed.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.rows, arrays, raw = read_columns(buffer)
+        self.ids = arrays["id"]
+        self.fragments = StringTable(arrays["json.offsets"], raw["json.data"])
+        self.categories = {
+            field: (StringTable(arrays[f"{field}.table.offsets"], raw[f"{field}.table.data"]), arrays[f"{field}.codes"])
+            for field in CATEGORY_FIELDS
+        }
+        self.multi_categories = {
+            field: (StringTable(arrays[f"{field}.table.offsets"], raw[f"{field}.table.data"]),
+                    arrays[f"{field}.row_offsets"], arrays[f"{field}.codes"])
+            for field in MULTI_CATEGORY_FIELDS
+        }
+
+    @classmethod
+    def open(cls, path):
+        """Maps a file produced by `python -m services.atsservice.ats_server.columnar` read-only."""
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def from_resumes(cls, resumes):
+        buffer = io.BytesIO()
+        write_columns(build_columns(resumes), buffer)
+        return cls(buffer.getvalue())
+
+    @classmethod
+    def from_json_file(cls, path):
+        return cls.from_resumes(iter_resumes(path))
+
+    def __len__(self):
+        return self.rows
+
+    def sample(self, k: int) -> list[int]:
+        # random.sample over a range never materializes the population
+        return random.sample(range(self.rows), k)
+
+    def shuffled(self, seed: int, start: int, stop: int, rows=None) -> list[int]:
+        """Rows at positions [start, stop) of the seeded permutation of the pool (or of `rows`)."""
+        positions = permutation(seed, len(self) if rows is None else len(rows))[start:stop].tolist()
+        return positions if rows is None else [int(rows[position]) for position in positions]
+
+    def resume(self, row: int) -> dict:
+        return json.loads(bytes(self.fragments.raw(row)))
+
+    def fragment(self, row: int) -> memoryview:
+        return self.fragments.raw(row)
+
+    def category(self, field: str):
+        """(string table, code per row) for location, headline or revision_date."""
+        return self.categories[field]
+
+    def multi_category(self, field: str):
+        """(string table, row offsets, codes) for skills or languages."""
+        return self.multi_categories[field]
+
+    def render(self, rows: list[int], key: str = "chosen_candidates", **extra) -> bytes:
+        body = b",".join(self.fragments.raw(row) for row in rows)
+        tail = b"".join(b"," + json.dumps(name).encode("utf-8") + b":" + json.dumps(value).encode("utf-8")
+                        for name, value in extra.items())
+        return b'{"' + key.encode("utf-8") + b'":[' + body + b"]" + tail + b"}"
@@ -1,37 +1,122 @@
-from fastapi import FastAPI, HTTPException
-import json
-import numpy as np
+from fastapi import FastAPI, HTTPException, Response, Query, Depends
+from fastapi.responses import StreamingResponse
+from typing import Optional, List
 import asyncio
+import os
 import random
 import uvicorn
 from pathlib import Path
+from services.atsservice.ats_server.resume_store import ResumeStore
+from services.atsservice.ats_server.resume_index import ResumeIndex
+from models.codec import FastJSONResponse
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 server_dir = Path(__file__).parent
 json_file = server_dir / "new_can.json"
 
-with open(json_file, "r", encoding="utf-8") as f:
-    data = json.load(f)
+# ATS_STORE указывает на колоночный файл (см. columnar.py): его мапят все воркеры сразу,
+# без него резюме читаются из new_can.json в память процесса
+columnar_file = os.environ.get("ATS_STORE")
+store = ResumeStore.open(columnar_file) if columnar_file else ResumeStore.from_json_file(json_file)
+index = ResumeIndex(store)
 
 statisitc = {}
 
+STREAM_CHUNK = 64
+
+def resume_filters(skills: Optional[List[str]] = Query(None), 
+                   languages: Optional[List[str]] = Query(None),
+                   location: Optional[str] = None, 
+                   headline: Optional[str] = None,
+                   revision_date_from: Optional[str] = None, 
+                   revision_date_to: Optional[str] = None):
+    return index.query(skills=skills, languages=languages, location=location, headline=headline,
+                       revision_date_from=revision_date_from, revision_date_to=revision_date_to)
+
+
 @app.get("/get_candidates")
-async def get_candidates(number_of_resumes: int):
+async def get_candidates(number_of_resumes: int, rows = Depends(resume_filters)):
 
-    if number_of_resumes > len(data["list_of_resumes"]):
+    if rows is None and number_of_resumes > len(store):
          raise HTTPException(status_code=400, detail="Too many resumes requested") 
     
     time = random.uniform(1, 4)
     
     await asyncio.sleep(time)
-    list_of_candidates = np.array(data["list_of_resumes"])
 
+    if rows is None:
+        chosen = store.sample(number_of_resumes)
+    else:
+        # с фильтрами отдаём не больше, чем нашлось подходящих резюме
+        chosen = [int(rows[i]) for i in random.sample(range(len(rows)), min(number_of_resumes, len(rows)))]
+
+    return Response(content=store.render(chosen), 
+                    media_type="application/json")
+
+
+def parse_cursor(cursor: Optional[str], total: int):
+    if not cursor:
+        return random.getrandbits(32), 0
+    try:
+        seed, offset = (int(part) for part in cursor.split("."))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # seed должен подходить для SeedSequence: иначе ошибка всплыла бы уже посреди отданного потока
+    if seed < 0 or seed >= 2**32 or offset < 0 or offset > total:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return seed, offset
+
+
+@app.get("/candidates/stream")
+async def stream_candidates(page_size: int = Query(100, ge=1, le=10000), cursor: Optional[str] = None,
+                            rows = Depends(resume_filters)):
+    # Страница - это отрезок одной и той же перестановки, поэтому повторы между страницами невозможны.
+    # С фильтрами переставляются только подходящие строки, курсор нужно передавать с теми же фильтрами
+    total = len(store) if rows is None else len(rows)
+    seed, offset = parse_cursor(cursor, total)
+    stop = min(offset + page_size, total)
+    next_cursor = f"{seed}.{stop}" if stop < total else ""
+    # страница строится до ответа: любая ошибка станет HTTP-статусом, а не оборванным потоком
+    page = store.shuffled(seed, offset, stop, rows)
+
+    async def ndjson():
+        chunk = []
+        for row in page:
+            chunk.append(store.fragment(row))
+            if len(chunk) == STREAM_CHUNK:
+                yield b"\n".join(chunk) + b"\n"
+                chunk = []
+        if chunk:
+            yield b"\n".join(chunk) + b"\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson", 
+                             headers={"X-Next-Cursor": next_cursor})
+
+
+
+def parse_watermark(since: Optional[str]):
+    if not since:
+        return None, None
+    try:
+        revision_date, resume_id = since.rsplit("|", 1)
+        return revision_date, int(resume_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid watermark")
+
+
+@app.get("/changes")
+async def get_changes(since: Optional[str] = None, limit: int = Query(500, ge=1, le=10000)):
+    # Водяной знак - ключ "revision_date|id" последнего отданного резюме, его хранит вызывающая сторона.
+    # Стоимость вызова - O(log n + размер страницы), а не размер всей базы
+    revision_date, resume_id = parse_watermark(since)
+    start, stop = index.changes_since(revision_date, resume_id, limit)
 
-    return {"chosen_candidates": 
-            np.random.choice(list_of_candidates, number_of_resumes, replace = False).tolist()
-            }
+    watermark = "|".join(map(str, index.key(stop - 1))) if stop > start else (since or "")
+    rows = [int(row) for row in index.date_order[start:stop]]
 
+    return Response(content=store.render(rows, key="changes", watermark=watermark, has_more=stop < len(store)),
+                    media_type="application/json")
 
     
 
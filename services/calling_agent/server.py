@@ -1,7 +1,12 @@
 
 import asyncio
 import random
-from fastapi import FastAPI
+import httpx
+from functools import partial
+from typing import Optional
+from fastapi import FastAPI, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 from contextlib import asynccontextmanager
 from pathlib import Path
 import sys
@@ -11,30 +16,65 @@ ROOT_DIR = Path(__file__).resolve().parents[2]
 if str(ROOT_DIR) not in sys.path:
     sys.path.append(str(ROOT_DIR))
 
-from models.candidate_resume import Resume
+from models.codec import FastJSONResponse, json_body, validate_resumes
 
 
 call_sem = asyncio.Semaphore(8)
 state_dict = {}
 tasks_dict = {}
+# Куда сообщать о переходах звонков: index -> callback_url Task Manager
+callbacks = {}
+# id запуска звонков по index: повторный /call_webhook с тем же id не звонит снова
+call_ids = {}
+PUSH_QUEUE_SIZE = 10_000
+
+
+def push_transition(index: int, position: int, state: dict):
+    """Queues the new state of one call for the Task Manager callback, if there is one."""
+    callback_url = callbacks.get(index)
+    if callback_url is None:
+        return
+    try:
+        app.state.pushes.put_nowait((callback_url, {"index": index, "position": position, "status": dict(state)}))
+    except asyncio.QueueFull:
+        # потерянный переход Task Manager подберёт сверкой через /check_status
+        print(f"⚠️ Push queue is full, transition of call {index}/{position} dropped")
+
+
+async def push_worker():
+    # Один отправитель: переходы одного звонка доходят в том порядке, в котором произошли
+    while True:
+        callback_url, update = await app.state.pushes.get()
+        try:
+            r = await app.state.client_callback.post(callback_url, **json_body(update))
+            r.raise_for_status()
+        except Exception as e:
+            print(f"⚠️ Failed to push call status to {callback_url}: {e}")
+
 
-from typing import List
+def forget_callback(index: int, _task: asyncio.Task):
+    # последний переход уже в очереди отправки: когда все звонки индекса закончены, адрес больше не нужен
+    if all(task.done() for task in tasks_dict.get(index, [])):
+        callbacks.pop(index, None)
 
 
-async def make_call(candidate: dict, state: dict):
+async def make_call(candidate: dict, state: dict, notify=lambda: None):
     try:
         async with call_sem:
             await asyncio.sleep(random.uniform(1, 100))
             state["accept_call"] = True
+            notify()
             await asyncio.sleep(random.uniform(1, 10))
-            state["finished_call"] = True
             if random.random() < 0.7:
                 print(f"Кандидат {candidate} ответил на звонок")
                 state["approved"] = True
-                return {"result": candidate}
+                result = {"result": candidate}
             else:
                 state["approved"] = False
-                return {"result": None}
+                result = {"result": None}
+            state["finished_call"] = True
+            notify()
+            return result
     except asyncio.CancelledError:
         raise
     except Exception as e:
@@ -44,20 +84,42 @@ async def make_call(candidate: dict, state: dict):
 async def lifespan(app: FastAPI):
     loop = asyncio.get_running_loop()
     app.state.loop = loop
+    app.state.client_callback = httpx.AsyncClient(timeout=5)
+    app.state.pushes = asyncio.Queue(maxsize=PUSH_QUEUE_SIZE)
+    pusher = loop.create_task(push_worker())
     yield
+    pusher.cancel()
+    await app.state.client_callback.aclose()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 @app.post("/call_webhook")
-async def call_webhook(candidates: List[Resume], index: int):
+async def call_webhook(request: Request, index: int, callback_url: Optional[str] = None,
+                       call_id: Optional[str] = None):
+    if call_id is not None and call_ids.get(index) == call_id:
+        # Task Manager упал после вызова и повторяет его: звонки уже идут
+        return {"status": "started"}
+    # List[Resume] валидируется кэшированным TypeAdapter прямо из байтов тела
+    try:
+        candidates = validate_resumes(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
     state_dict[index] = [
         {"candidate_name": candidate.person_name, "accept_call": False, "approved": False, "finished_call": False}
         for candidate in candidates
     ]
 
+    if callback_url:
+        callbacks[index] = callback_url
+    if call_id is not None:
+        call_ids[index] = call_id
+
     tasks_dict.setdefault(index, [])
-    for candidate, state in zip(candidates, state_dict[index]):
-        tasks_dict[index].append(app.state.loop.create_task(make_call(candidate, state)))
+    for position, (candidate, state) in enumerate(zip(candidates, state_dict[index])):
+        notify = partial(push_transition, index, position, state)
+        task = app.state.loop.create_task(make_call(candidate, state, notify))
+        tasks_dict[index].append(task)
+        task.add_done_callback(partial(forget_callback, index))
 
     return {"status": "started"}
 
@@ -67,6 +129,8 @@ async def check_status(index: int):
 
 @app.post("/kill_task")
 async def kill_process(index: int):
+    callbacks.pop(index, None)
+    call_ids.pop(index, None)
     for task in tasks_dict.get(index, []):
         task.cancel()
     return {"status": "cancelled"}
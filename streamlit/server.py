@@ -4,8 +4,16 @@ from pydantic import BaseModel
 import asyncio
 from typing import List
 import uvicorn
+import sys
+from pathlib import Path
 
-app = FastAPI(title="Pipeline WebSocket Server")
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+from models.codec import FastJSONResponse, dumps_str
+
+app = FastAPI(title="Pipeline WebSocket Server", default_response_class=FastJSONResponse)
 
 # CORS для Streamlit
 app.add_middleware(
@@ -167,15 +175,17 @@ async def broadcast_candidates(data: CandidatesBroadcast):
     """Отправляет информацию о найденных кандидатах в Streamlit чат"""
     print(f"📋 Broadcasting {data.count} candidates for pipeline #{data.index_of_pipeline}")
     
+    # сериализуем один раз на всех клиентов
+    message = dumps_str({
+        "type": "candidates_found",
+        "index_of_pipeline": data.index_of_pipeline,
+        "candidates": data.candidates,
+        "count": data.count
+    })
     disconnected = []
     for client in connected_clients:
         try:
-            await client.send_json({
-                "type": "candidates_found",
-                "index_of_pipeline": data.index_of_pipeline,
-                "candidates": data.candidates,
-                "count": data.count
-            })
+            await client.send_text(message)
         except Exception as e:
             print(f"❌ Failed to send to client: {e}")
             disconnected.append(client)
@@ -0,0 +1,101 @@
+import asyncio
+import itertools
+import uuid
+from collections import OrderedDict
+from typing import Optional
+import websockets
+from models.codec import dumps_str, loads
+
+
+class AgentChannel:
+    """One long-lived WebSocket to the agent shared by every task.
+
+    Each update gets a `request_id`; the agent echoes it in its ack, so any number of
+    tasks can wait for their own acks over the same connection. The connection is
+    re-established with exponential backoff, and updates that were not acked yet
+    are sent again after a reconnect (the agent drops repeated request_ids).
+    """
+
+    def __init__(self, url: str, ack_timeout: float = 30, max_backoff: float = 10):
+        self.url = url
+        self.ack_timeout = ack_timeout
+        self.max_backoff = max_backoff
+        # префикс отличает запуски Task Manager: после перезапуска счётчик начинается заново
+        self.prefix = uuid.uuid4().hex[:12]
+        self.ids = itertools.count(1)
+        self.unacked: OrderedDict[str, tuple[str, asyncio.Future]] = OrderedDict()
+        self.ws = None
+        self.connected = asyncio.Event()
+        self.send_lock = asyncio.Lock()
+        self.runner: Optional[asyncio.Task] = None
+        self.reconnects = 0
+
+    def start(self):
+        self.runner = asyncio.get_running_loop().create_task(self.run())
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self.runner is not None:
+            self.runner.cancel()
+            await asyncio.gather(self.runner, return_exceptions=True)
+        for _, future in self.unacked.values():
+            future.cancel()
+
+    async def run(self):
+        backoff = 0.5
+        while True:
+            try:
+                async with websockets.connect(self.url) as ws:
+                    self.ws = ws
+                    backoff = 0.5
+                    # всё, что не дождалось подтверждения до обрыва, отправляем заново в исходном порядке
+                    async with self.send_lock:
+                        for text, _ in list(self.unacked.values()):
+                            await ws.send(text)
+                    self.connected.set()
+                    async for message in ws:
+                        self.acknowledge(loads(message))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Agent WebSocket lost: {e!r}, reconnecting in {backoff:.1f}s")
+            finally:
+                self.connected.clear()
+                self.ws = None
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def acknowledge(self, ack: dict):
+        entry = self.unacked.pop(str(ack.get("request_id")), None)
+        if entry is not None and not entry[1].done():
+            entry[1].set_result(ack)
+
+    def new_request_id(self) -> str:
+        return f"{self.prefix}-{next(self.ids)}"
+
+    async def send(self, payload: dict, request_id: Optional[str] = None) -> dict:
+        """Sends one update and waits for the agent's ack with the same request_id.
+
+        A caller that retries the same update after a timeout passes the same `request_id`,
+        so the agent does not apply it twice if only the ack was lost.
+        """
+        request_id = request_id or self.new_request_id()
+        text = dumps_str({**payload, "request_id": request_id})
+        future = asyncio.get_running_loop().create_future()
+        self.unacked[request_id] = (text, future)
+        try:
+            await asyncio.wait_for(self.connected.wait(), self.ack_timeout)
+            async with self.send_lock:
+                if self.ws is not None:
+                    try:
+                        await self.ws.send(text)
+                    except websockets.ConnectionClosed:
+                        pass  # переотправим после переподключения
+            return await asyncio.wait_for(asyncio.shield(future), self.ack_timeout)
+        finally:
+            self.unacked.pop(request_id, None)
+
+    def stats(self) -> dict:
+        return {"connected": self.connected.is_set(), "unacked": len(self.unacked), "reconnects": self.reconnects}
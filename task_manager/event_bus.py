@@ -0,0 +1,306 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Iterable, Optional
+from models.codec import json_body
+
+
+@dataclass
+class PipelineEvent:
+    """A change of one pipeline component; every sink turns it into its own message."""
+    index_of_pipeline: str
+    index_of_component: int
+    type_of_component: str  # ats_component, ai_matching, voice_bot_component
+    state_changes: dict
+    candidates: Optional[list] = None  # новые кандидаты AI Matching; [] тоже уходит в Streamlit
+    partial: Optional[bool] = None  # AI Matching: будут ещё батчи
+    finish_task: Optional[bool] = None  # Voice Bot
+    statuses: Optional[list] = None  # Voice Bot: статус по каждому кандидату
+    clients_stats: Optional[dict] = None  # Voice Bot: сводка звонков для Streamlit
+    # Voice Bot: только изменившиеся статусы {position, version, status} и номера до и после них
+    status_changes: Optional[list] = None
+    base_seq: Optional[int] = None
+    seq: Optional[int] = None
+    # id обновления для агента: повтор того же события уходит с тем же id, слитое событие - с новым
+    request_id: Optional[str] = None
+
+    @property
+    def key(self) -> tuple:
+        return self.index_of_pipeline, self.index_of_component
+
+    def merge(self, later: "PipelineEvent") -> "PipelineEvent":
+        """One event with the effect of `self` followed by `later`."""
+        candidates = self.candidates
+        if later.candidates is not None:
+            candidates = (candidates or []) + later.candidates
+        status_changes = self.status_changes
+        if later.status_changes is not None:
+            # у кандидата важна только последняя версия статуса
+            latest = {change["position"]: change for change in status_changes or []}
+            latest.update((change["position"], change) for change in later.status_changes)
+            status_changes = list(latest.values())
+        return replace(
+            later,
+            state_changes={**self.state_changes, **later.state_changes},
+            candidates=candidates,
+            partial=later.partial if later.partial is not None else self.partial,
+            finish_task=later.finish_task if later.finish_task is not None else self.finish_task,
+            statuses=later.statuses if later.statuses is not None else self.statuses,
+            clients_stats=later.clients_stats if later.clients_stats is not None else self.clients_stats,
+            status_changes=status_changes,
+            base_seq=self.base_seq if self.base_seq is not None else later.base_seq,
+            seq=later.seq if later.seq is not None else self.seq,
+            request_id=None,
+        )
+
+
+class Sink(ABC):
+    name = "sink"
+    # события лога можно терять при переполнении и ошибке доставки, обновления агента и Streamlit - нет
+    droppable = False
+    # сколько раз повторять недоставленное событие; None - пока не доставим. Только такие получатели
+    # подтверждают доставку издателю: ждать получателя, который может сдаться, нельзя
+    max_retries: Optional[int] = None
+
+    @property
+    def guaranteed(self) -> bool:
+        return not self.droppable and self.max_retries is None
+
+    @abstractmethod
+    async def deliver(self, event: PipelineEvent):
+        """Sends one (possibly merged) event; raises if it was not delivered."""
+
+
+class AgentSink(Sink):
+    name = "agent"
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def payload(self, event: PipelineEvent, snapshot: bool = False) -> dict:
+        payload = {"user_id": "0", "session_id": "0",
+                   "index_of_pipeline": event.index_of_pipeline,
+                   "index_of_component": event.index_of_component,
+                   "type_of_component": event.type_of_component,
+                   "state_changes": event.state_changes}
+        if event.type_of_component == "ai_matching":
+            payload["partial"] = bool(event.partial)
+            payload["candidates"] = [{"result": event.candidates or []}]
+        if event.type_of_component == "voice_bot_component":
+            payload["finish_task"] = event.finish_task
+            payload["seq"] = event.seq
+            if event.status_changes is not None and not snapshot:
+                payload["base_seq"] = event.base_seq
+                payload["status_changes"] = event.status_changes
+            else:
+                payload["status_about_each_candidate"] = (event.statuses or []) if event.finish_task is not None else None
+        return payload
+
+    async def deliver(self, event: PipelineEvent):
+        if event.request_id is None:
+            event.request_id = self.channel.new_request_id()
+        response = await self.channel.send(self.payload(event), event.request_id)
+        if response.get("snapshot_required"):
+            # агент пропустил часть изменений (или перезапускался) - отправляем полный список статусов
+            response = await self.channel.send(self.payload(event, snapshot=True))
+        print(f"Ответ: {response}")
+
+
+class DashboardSink(Sink):
+    name = "dashboard"
+    # Streamlit - только отображение: пока он недоступен, задачи и контрольные точки его не ждут
+    max_retries = 5
+
+    def __init__(self, client):
+        self.client = client
+
+    async def deliver(self, event: PipelineEvent):
+        status = {"index_of_pipeline": event.index_of_pipeline,
+                  "index_of_component": event.index_of_component,
+                  "state_changes": event.state_changes}
+        if event.clients_stats is not None:
+            status["clients_stats"] = event.clients_stats
+        r = await self.client.post("/update_pipeline_status", **json_body(status))
+        r.raise_for_status()
+        if event.candidates is not None:
+            r = await self.client.post("/broadcast_candidates", **json_body({
+                "index_of_pipeline": event.index_of_pipeline,
+                "candidates": event.candidates,
+                "count": len(event.candidates)}))
+            r.raise_for_status()
+            print(f"✅ Sent {len(event.candidates)} candidates to Streamlit")
+
+
+class LogSink(Sink):
+    name = "log"
+    droppable = True
+
+    async def deliver(self, event: PipelineEvent):
+        found = f", кандидатов: {len(event.candidates)}" if event.candidates is not None else ""
+        print(f"📣 Пайплайн {event.index_of_pipeline}, компонент {event.index_of_component} "
+              f"({event.type_of_component}): {event.state_changes}{found}")
+
+
+class SinkWorker:
+    """Pending events of one sink and the task that delivers them.
+
+    Events of the same pipeline component that arrive within `window` seconds are merged
+    into one. `max_pending` bounds droppable sinks only: above it their oldest event is
+    discarded. A non-droppable sink keeps one merged event per component, so its queue is
+    bounded by the number of active components rather than by `max_pending`.
+
+    An event a non-droppable sink failed to deliver goes back to the front of the queue,
+    merged with anything newer for its component, and is retried after a delay that doubles
+    on each failed pass from `retry_delay` up to `max_retry_delay`. A sink with `max_retries`
+    set gives the event up (counted as dropped) after that many failed retries.
+
+    For a guaranteed sink (non-droppable, unlimited retries) `put` returns a future that is
+    resolved once the event (merged into whatever was sent) is delivered.
+    """
+
+    def __init__(self, sink: Sink, window: float, max_pending: int, retry_delay: float = 0.5,
+                 max_retry_delay: float = 30):
+        self.sink = sink
+        self.window = window
+        self.max_pending = max_pending
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.backoff = 0.0
+        self.pending: OrderedDict[tuple, PipelineEvent] = OrderedDict()
+        self.waiters: dict[tuple, list[asyncio.Future]] = {}
+        self.attempts: dict[tuple, int] = {}
+        self.ready = asyncio.Event()
+        self.runner: Optional[asyncio.Task] = None
+        self.closed = False
+        self.published = 0
+        self.coalesced = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retried = 0
+        self.lag = 0.0
+
+    def put(self, event: PipelineEvent) -> Optional[asyncio.Future]:
+        self.published += 1
+        if event.key in self.pending:
+            self.pending[event.key] = self.pending[event.key].merge(event)
+            self.coalesced += 1
+        else:
+            if len(self.pending) >= self.max_pending and self.sink.droppable:
+                self.pending.popitem(last=False)
+                self.dropped += 1
+            self.pending[event.key] = event
+        self.ready.set()
+        if not self.sink.guaranteed:
+            return None
+        delivered = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(event.key, []).append(delivered)
+        return delivered
+
+    async def run(self):
+        while True:
+            await self.ready.wait()
+            if not self.closed:
+                # окно: даём догнать событиям того же компонента, чтобы отправить их одним сообщением
+                await asyncio.sleep(self.window)
+            await self.flush()
+            if self.closed and not self.pending:
+                return
+            if self.backoff:
+                # доставка не удалась: ждём перед повтором, новые события тем временем сливаются в очереди
+                await asyncio.sleep(self.backoff)
+
+    async def flush(self):
+        self.ready.clear()
+        events, self.pending = list(self.pending.values()), OrderedDict()
+        waiters, self.waiters = self.waiters, {}
+        if not events:
+            return
+        started = time.monotonic()
+        # компоненты независимы, поэтому их события уходят параллельно
+        results = await asyncio.gather(*(self.sink.deliver(event) for event in events), return_exceptions=True)
+        failed = []
+        for event, result in zip(events, results):
+            if isinstance(result, Exception):
+                self.failed += 1
+                print(f"⚠️ Failed to deliver event of pipeline {event.index_of_pipeline} to {self.sink.name}: {result!r}")
+                if self.sink.droppable:
+                    continue
+                self.attempts[event.key] = self.attempts.get(event.key, 0) + 1
+                if self.sink.max_retries is not None and self.attempts[event.key] > self.sink.max_retries:
+                    # получатель не гарантированный: его доставку никто не ждёт, событие просто теряется
+                    del self.attempts[event.key]
+                    self.dropped += 1
+                    print(f"⚠️ Gave up on event of pipeline {event.index_of_pipeline} for {self.sink.name}")
+                else:
+                    failed.append(event)
+            else:
+                self.delivered += 1
+                self.attempts.pop(event.key, None)
+                for delivered in waiters.pop(event.key, []):
+                    if not delivered.done():
+                        delivered.set_result(None)
+        self.lag = time.monotonic() - started
+        self.requeue(failed, waiters)
+
+    def requeue(self, failed: list[PipelineEvent], waiters: dict[tuple, list[asyncio.Future]]):
+        if not failed:
+            self.backoff = 0.0
+            return
+        # неудавшееся событие старше всего, что пришло за время доставки: оно идёт первым,
+        # а более новое событие того же компонента сливается поверх него
+        for event in reversed(failed):
+            newer = self.pending.pop(event.key, None)
+            self.pending[event.key] = event.merge(newer) if newer is not None else event
+            self.pending.move_to_end(event.key, last=False)
+            self.waiters[event.key] = waiters.get(event.key, []) + self.waiters.get(event.key, [])
+        self.retried += len(failed)
+        self.backoff = min(self.max_retry_delay, self.backoff * 2 if self.backoff else self.retry_delay)
+        self.ready.set()
+
+    def stats(self) -> dict:
+        return {"pending": len(self.pending), "published": self.published, "coalesced": self.coalesced,
+                "delivered": self.delivered, "dropped": self.dropped, "failed": self.failed,
+                "retried": self.retried, "retry_delay_seconds": self.backoff,
+                "last_delivery_seconds": round(self.lag, 4)}
+
+
+class EventBus:
+    """In-process publish/subscribe for pipeline events.
+
+    `publish` only records the event for each sink and never waits, so a slow agent or
+    Streamlit cannot stall the tasks or the scheduler; every sink is drained by its own
+    worker. The future it returns is resolved once every guaranteed sink (the agent) has
+    delivered the event, for callers that must not move on before that (e.g. a task
+    checkpoint); best-effort sinks such as Streamlit are never waited on.
+    """
+
+    def __init__(self, sinks: Iterable[Sink], window: float = 0.1, max_pending: int = 1000):
+        self.workers = [SinkWorker(sink, window, max_pending) for sink in sinks]
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        for worker in self.workers:
+            worker.runner = loop.create_task(worker.run())
+
+    def publish(self, event: PipelineEvent) -> asyncio.Future:
+        waiters = [worker.put(event) for worker in self.workers]
+        return asyncio.gather(*(delivered for delivered in waiters if delivered is not None))
+
+    async def close(self, timeout: float = 5):
+        # то, что уже опубликовано, воркеры доставляют последним проходом до остановки
+        for worker in self.workers:
+            worker.closed = True
+            worker.ready.set()
+        runners = [worker.runner for worker in self.workers if worker.runner is not None]
+        if not runners:
+            return
+        done, pending = await asyncio.wait(runners, timeout=timeout)
+        for runner in pending:
+            runner.cancel()
+        await asyncio.gather(*runners, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {worker.sink.name: worker.stats() for worker in self.workers}
@@ -1,174 +1,245 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 import uvicorn
 from contextlib import asynccontextmanager
 import asyncio
-import websockets
-import json
 import httpx
 import url
+import os
+import sys
+import uuid
+from functools import partial
+from pathlib import Path
+from typing import Optional
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
+from models.codec import FastJSONResponse, json_body, loads
+from agent_channel import AgentChannel
+from event_bus import AgentSink, DashboardSink, EventBus, LogSink, PipelineEvent
+from task_journal import TaskJournal, TaskSupervisor, skip_checkpoint
+from services.atsservice.ats_client.client import ATSClient
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.jobstores.base import JobLookupError
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     loop = asyncio.get_running_loop()
     app.state.loop = loop
-    app.state.client_ats =  httpx.AsyncClient(base_url= url.url_ats, 
-                                              timeout=None)
+    app.state.client_ats = ATSClient(url.url_ats, timeout=None)
     app.state.client_ai_matching = httpx.AsyncClient(base_url= url.url_ai_matching, 
                                                      timeout=None)
     app.state.client_voice_bot = httpx.AsyncClient(base_url= url.url_voice_bot, 
                                                      timeout=None)
+    # Одно постоянное соединение с агентом и один пул соединений со Streamlit на все задачи
+    app.state.agent = AgentChannel(url.url_agent_websocket)
+    app.state.agent.start()
+    app.state.client_dashboard = httpx.AsyncClient(base_url=url.url_dashboard, timeout=10)
+    # Задачи только публикуют события; агенту, в Streamlit и в лог их доставляют воркеры шины
+    app.state.events = EventBus([AgentSink(app.state.agent), DashboardSink(app.state.client_dashboard), LogSink()],
+                                window=EVENT_WINDOW, max_pending=EVENT_MAX_PENDING)
+    app.state.events.start()
     app.state.scheduler = AsyncIOScheduler()
 
     app.state.scheduler.start()
 
+    # Задачи записываются в журнал SQLite; незавершённые продолжаются с последней контрольной точки
+    journal = TaskJournal(os.getenv("TASK_MANAGER_JOURNAL", str(Path(__file__).resolve().parent / "tasks.sqlite3")))
+    app.state.tasks = TaskSupervisor(journal, {"ATS": task_for_adding_people_to_ai_matching,
+                                               "AI_Matching": task_for_ai_matching,
+                                               "Voice_bot": task_for_voice_bot})
+    resumed = await app.state.tasks.resume()
+    if resumed:
+        print(f"♻️ Resumed {resumed} unfinished tasks")
+
     yield 
 
-app = FastAPI(lifespan=lifespan)
-
-async def task_for_adding_people_to_ai_matching(parameters: dict):
-
-    ws = await websockets.connect(url.url_agent_websocket)
-
-    try: 
-        response = await app.state.client_ats.get("/get_candidates", 
-        params = {"number_of_resumes" : parameters["number_of_resumes"]})
-
-        candidates =  response.json()["chosen_candidates"]
-        await  app.state.client_ai_matching.post("/add_candidates", json= candidates)
-                
-        payload = {"user_id": "0", "session_id":"0",
-                        "index_of_pipeline": parameters["index_of_pipeline"], 
-                        "index_of_component": parameters["index_of_component"],
-                        "type_of_component": "ats_component",
-                        "state_changes": {"COMPLETED" : True, "NOT_STARTED": False}}
-                
-        await ws.send(json.dumps(payload))
-        response = await ws.recv()
-
-        try:
-            async with httpx.AsyncClient() as client:
-                await client.post(
-                    "http://localhost:8765/update_pipeline_status",
-                    json={
-                        "index_of_pipeline": parameters["index_of_pipeline"],
-                        "index_of_component": parameters["index_of_component"],
-                        "state_changes": {"COMPLETED": True, "NOT_STARTED": False}
-                    }
-                )
-        except Exception as e:
-            print(f"Failed to update Streamlit: {e}")
-
-
-        print(f"Ответ: {response}")
-    finally:
-        await ws.close()
-
-
-async def task_for_ai_matching(parameters: dict):
-    ws = await websockets.connect(url.url_agent_websocket)
-    try:
-        result = await app.state.client_ai_matching.get("/start_search_candidates", 
-                                                            params = {"jobpost" : parameters["resume"], 
-                                                                    "number_of_candidates": parameters["number_of_candidates"]})
-        print("результат:", result.json()["result"])
-        payload = {"user_id": "0", "session_id":"0",
-                        "index_of_pipeline": parameters["index_of_pipeline"],
-                        "index_of_component": parameters["index_of_component"],
-                        "type_of_component": "ai_matching",
-                        "candidates": result.json()["result"],
-                        "state_changes": {"COMPLETED" : True, "NOT_STARTED": False}}
-                
-        await ws.send(json.dumps(payload))
-        response = await ws.recv()
-        print(f"Ответ: {response}")
-
-        try:
-            async with httpx.AsyncClient() as client:
-                await client.post(
-                    "http://localhost:8765/update_pipeline_status",
-                    json={
-                        "index_of_pipeline": parameters["index_of_pipeline"],
-                        "index_of_component": parameters["index_of_component"],
-                        "state_changes": {"COMPLETED": True, "NOT_STARTED": False}
-                    }
-                )
-        except Exception as e:
-            print(f"Failed to update Streamlit: {e}")
-
-       
-        candidates_data = result.json()["result"]
-        print(f"🔍 AI Matching result structure: {type(candidates_data)}, length: {len(candidates_data) if isinstance(candidates_data, list) else 'N/A'}")
-        print(f"🔍 First batch: {candidates_data[0] if candidates_data else 'empty'}")
-        
-        candidates_found = []
-        
-        for i, batch in enumerate(candidates_data):
-            print(f"🔍 Processing batch {i}: {type(batch)}, has 'result': {batch.get('result') if isinstance(batch, dict) else 'not a dict'}")
-            if batch and batch.get("result"):
-                candidates_found.extend(batch["result"])
-                print(f"✅ Added {len(batch['result'])} candidates from batch {i}")
-        
-        print(f"🔍 Total candidates found: {len(candidates_found)}")
-        
-        if candidates_found:
-            print(f"📤 Attempting to send {len(candidates_found)} candidates to Streamlit...")
-            try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        "http://localhost:8765/broadcast_candidates",
-                        json={
-                            "index_of_pipeline": parameters["index_of_pipeline"],
-                            "candidates": candidates_found,
-                            "count": len(candidates_found)
-                        }
-                    )
-                    print(f"✅ Sent {len(candidates_found)} candidates to Streamlit. Response: {response.status_code}")
-            except Exception as e:
-                print(f"⚠️ Failed to send candidates to Streamlit: {e}")
+    await app.state.tasks.close()
+    app.state.scheduler.shutdown(wait=False)
+    await app.state.events.close()
+    await app.state.agent.close()
+    for client in (app.state.client_ats.client, app.state.client_ai_matching, app.state.client_voice_bot,
+                   app.state.client_dashboard):
+        await client.aclose()
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+ATS_PAGE_SIZE = 500
+AI_MATCHING_BATCH_SIZE = 100
+# Сколько секунд AI Matching держит запрос результатов, пока не появятся новые кандидаты
+AI_MATCHING_POLL_WAIT = 10
+# События одного компонента пайплайна, пришедшие за это время, отправляются одним сообщением
+EVENT_WINDOW = 0.1
+EVENT_MAX_PENDING = 1000
+# Статусы звонков Voice Bot присылает сам; опрос /check_status - только редкая сверка
+VOICE_BOT_RECONCILE_SECONDS = 30
+
+
+async def stream_candidates_to_ai_matching(number_of_resumes: int, filters: dict = None, checkpoint: dict = None,
+                                          save=skip_checkpoint):
+    # Резюме читаются из ATS постранично и сразу пересылаются в AI Matching небольшими пачками,
+    # поэтому в памяти никогда не лежит больше одной страницы
+    checkpoint = checkpoint or {"cursor": None, "sent": 0, "done": False}
+    if checkpoint["done"]:
+        return
+    # после перезапуска продолжаем со страницы, следующей за последней сохранённой;
+    # недосланная часть страницы уйдёт повторно, /add_candidates обновляет резюме по id
+    sent = checkpoint["sent"]
+    async for lines, cursor in app.state.client_ats.iter_pages(number_of_resumes - sent, ATS_PAGE_SIZE, filters,
+                                                               checkpoint["cursor"]):
+        # строки NDJSON уже готовый JSON резюме: склеиваем их в массив, не разбирая и не сериализуя заново
+        for start in range(0, len(lines), AI_MATCHING_BATCH_SIZE):
+            await post_raw_candidates(lines[start:start + AI_MATCHING_BATCH_SIZE])
+        sent += len(lines)
+        await save({"cursor": cursor, "sent": sent, "done": not cursor or sent >= number_of_resumes})
+
+async def post_raw_candidates(lines: list[str]):
+    r = await app.state.client_ai_matching.post("/add_candidates", content="[" + ",".join(lines) + "]",
+                                                headers={"Content-Type": "application/json"})
+    r.raise_for_status()
+
+
+async def task_for_adding_people_to_ai_matching(parameters: dict, checkpoint: dict = None, save=skip_checkpoint):
+
+    await stream_candidates_to_ai_matching(parameters["number_of_resumes"], parameters.get("filters"), checkpoint, save)
+
+    # задача (и запись в журнале) завершается только после доставки агенту: после падения до неё
+    # задача продолжится с контрольной точки done и опубликует COMPLETED снова
+    await app.state.events.publish(PipelineEvent(
+        index_of_pipeline=parameters["index_of_pipeline"],
+        index_of_component=parameters["index_of_component"],
+        type_of_component="ats_component",
+        state_changes={"COMPLETED": True, "NOT_STARTED": False}))
+
+
+async def iter_search_results(search_id: str, offset: int = 0):
+    """Long-polls /searches/{id}/results; yields (new candidates, progress) until the search is finished."""
+    while True:
+        r = await app.state.client_ai_matching.get(f"/searches/{search_id}/results",
+                                                   params={"offset": offset, "wait": AI_MATCHING_POLL_WAIT})
+        r.raise_for_status()
+        progress = loads(r.content)
+        candidates = progress.pop("candidates")
+        offset = progress["next_offset"]
+        yield candidates, progress
+        if progress["status"] != "running":
+            return
+
+
+def save_delivered(save, checkpoint: dict, delivered: asyncio.Future):
+    # батчи одного компонента доставляются по порядку, а журнал пишет в порядке вызовов save,
+    # поэтому контрольные точки сохраняются по порядку и без ожидания здесь
+    if not delivered.cancelled() and delivered.exception() is None:
+        save(checkpoint)
+
+
+async def task_for_ai_matching(parameters: dict, checkpoint: dict = None, save=skip_checkpoint):
+    # Кандидаты каждого батча публикуются сразу, как только AI Matching их нашёл;
+    # доставка агенту и в Streamlit идёт в фоне и не задерживает следующий опрос.
+    # Контрольная точка сдвигается только после доставки батча агенту: иначе после падения
+    # Task Manager опубликованные, но не доставленные кандидаты были бы потеряны.
+    # Streamlit доставляется по возможности, его недоступность задачу не держит
+    checkpoint = checkpoint or {"search_id": None, "offset": 0, "found": 0}
+    search_id, offset, found = checkpoint["search_id"], checkpoint["offset"], checkpoint["found"]
+    if search_id is not None:
+        # после перезапуска Task Manager поиск в AI Matching продолжается - дочитываем результаты с offset
+        r = await app.state.client_ai_matching.get(f"/searches/{search_id}")
+        if r.status_code == 404:
+            print(f"⚠️ AI Matching search {search_id} is gone, starting it again")
+            search_id, offset, found = None, 0, 0
         else:
-            try:
-                async with httpx.AsyncClient() as client:
-                    await client.post(
-                        "http://localhost:8765/broadcast_candidates",
-                        json={
-                            "index_of_pipeline": parameters["index_of_pipeline"],
-                            "candidates": [],
-                            "count": 0
-                        }
-                    )
-                    print(f"⚠️ No candidates found, notification sent to Streamlit")
-            except Exception as e:
-                print(f"⚠️ Failed to send no-candidates notification: {e}")
-    
-        
-    finally:
-        await ws.close()
-
-
-
-async def check_status(index_of_task: int, index_of_pipeline: str, index_of_component: int, scheduler: AsyncIOScheduler):
-    
-    response = await app.state.client_voice_bot.post(
-    f"/check_status?index={index_of_task}"
-)
-    statuses_json = response.json()
+            r.raise_for_status()
+            print(f"♻️ AI Matching search {search_id}: continuing from offset {offset}")
+    if search_id is None:
+        # Поиск идёт фоновой задачей AI Matching: держим не открытый стрим, а короткие long-poll запросы
+        r = await app.state.client_ai_matching.post("/searches",
+                                                    params = {"jobpost" : parameters["resume"],
+                                                              "number_of_candidates": parameters["number_of_candidates"]})
+        r.raise_for_status()
+        search_id = loads(r.content)["id"]
+        await save({"search_id": search_id, "offset": offset, "found": found})
+        print(f"🔍 AI Matching search {search_id} started")
+    async for batch, progress in iter_search_results(search_id, offset):
+        if not batch:
+            if progress["status"] != "running":
+                print(f"🔍 AI Matching search {search_id}: {progress}")
+            continue
+
+        found += len(batch)
+        delivered = app.state.events.publish(PipelineEvent(
+            index_of_pipeline=parameters["index_of_pipeline"],
+            index_of_component=parameters["index_of_component"],
+            type_of_component="ai_matching",
+            state_changes={"NOT_STARTED": False, "RUNNING": True},
+            candidates=batch,
+            partial=True))
+        delivered.add_done_callback(partial(save_delivered, save,
+                                            {"search_id": search_id, "offset": progress["next_offset"], "found": found}))
+
+    print(f"🔍 Total candidates found: {found}")
+    # задача завершается, когда итоговое событие (а с ним и все батчи до него) доставлено агенту
+    await app.state.events.publish(PipelineEvent(
+        index_of_pipeline=parameters["index_of_pipeline"],
+        index_of_component=parameters["index_of_component"],
+        type_of_component="ai_matching",
+        state_changes={"COMPLETED": True, "NOT_STARTED": False, "RUNNING": False},
+        # пустой список - Streamlit покажет, что никого не нашли
+        candidates=[] if found == 0 else None,
+        partial=False))
+
+
+
+# Статусы звонков по пайплайнам: переходы присылает Voice Bot, /check_status остаётся сверкой.
+# У каждого кандидата своя версия статуса, у пайплайна - номер последнего опубликованного изменения
+call_statuses = {}
+
+
+def merge_call_status(current: Optional[dict], update: dict) -> dict:
+    """The state of a call after `update`; never goes back, so a stale snapshot cannot undo a pushed transition."""
+    if current is None:
+        return update
+    merged = {**current, **update,
+              "accept_call": current["accept_call"] or update["accept_call"],
+              "finished_call": current["finished_call"] or update["finished_call"]}
+    if current["finished_call"]:
+        # итог завершённого звонка окончательный
+        merged["approved"] = current["approved"]
+    return merged
+
+
+def apply_call_statuses(index_of_pipeline: str, updates: dict):
+    """Applies {position: status} monotonically; publishes only the entries that really changed."""
+    tracked = call_statuses.get(index_of_pipeline)
+    if tracked is None:
+        return
+    # новый список, а не правка на месте: прежний ещё может лежать в неотправленном событии
+    statuses_json = list(tracked["statuses"])
+    versions = tracked["versions"]
+    changes = []
+    for position, update in sorted(updates.items()):
+        if position >= len(statuses_json):
+            continue
+        status = merge_call_status(statuses_json[position], update)
+        if statuses_json[position] == status:
+            continue
+        statuses_json[position] = status
+        versions[position] += 1
+        changes.append({"position": position, "version": versions[position], "status": status})
+    if not changes:
+        return
+    tracked["statuses"] = statuses_json
+    tracked["seq"] += 1
+    publish_call_statuses(index_of_pipeline, changes)
+
+
+def publish_call_statuses(index_of_pipeline: str, changes: list):
+    """Publishes the changed call statuses of a pipeline and stops tracking it once every call is finished."""
+    tracked = call_statuses[index_of_pipeline]
+    statuses_json = tracked["statuses"]
+    index_of_component = tracked["index_of_component"]
     finish_task = all(candidate["finished_call"] for candidate in statuses_json)
 
-    async with websockets.connect(url.url_agent_websocket) as ws:
-        print("Отправялем по вебсокету")
-        payload = {
-            "user_id": "0",
-            "session_id": "0",
-            "index_of_pipeline": index_of_pipeline,
-            "index_of_component": index_of_component,
-            "type_of_component": "voice_bot_component",
-            "finish_task": finish_task,
-            "status_about_each_candidate": statuses_json,
-            "state_changes": {"RUNNING": not finish_task, "COMPLETED": finish_task}
-        }
-        await ws.send(json.dumps(payload))
-
     answered = sum(1 for c in statuses_json if c["accept_call"])
     approved = sum(1 for c in statuses_json if c["approved"])
     declined = sum(1 for c in statuses_json if c["accept_call"] and not c["approved"])
@@ -184,130 +255,159 @@ async def check_status(index_of_task: int, index_of_pipeline: str, index_of_comp
         for c in statuses_json if c["accept_call"] and not c["approved"]
     ]
 
-    try:
-        async with httpx.AsyncClient() as client:
-            await client.post(
-                "http://localhost:8765/update_pipeline_status",
-                json={
-                    "index_of_pipeline": index_of_pipeline,
-                    "index_of_component": index_of_component,
-                    "state_changes": {"RUNNING": not finish_task, "COMPLETED": finish_task},
-                    "clients_stats": {
-                        "total": len(statuses_json),
-                        "answered": answered,
-                        "accepted_offer": approved,
-                        "declined_offer": declined,
-                        "accepted_candidates": accepted_candidates,  # НОВОЕ: Список принявших
-                        "declined_candidates": declined_candidates   # НОВОЕ: Список отклонивших
-                    }
-                }
-            )
-    except Exception as e:
-        print(f"⚠️ Failed to update Streamlit: {e}")
+    delivered = app.state.events.publish(PipelineEvent(
+        index_of_pipeline=index_of_pipeline,
+        index_of_component=index_of_component,
+        type_of_component="voice_bot_component",
+        state_changes={"RUNNING": not finish_task, "COMPLETED": finish_task},
+        finish_task=finish_task,
+        statuses=statuses_json,
+        status_changes=changes,
+        base_seq=tracked["seq"] - 1,
+        seq=tracked["seq"],
+        clients_stats={
+            "total": len(statuses_json),
+            "answered": answered,
+            "accepted_offer": approved,
+            "declined_offer": declined,
+            "accepted_candidates": accepted_candidates,  # НОВОЕ: Список принявших
+            "declined_candidates": declined_candidates   # НОВОЕ: Список отклонивших
+        }))
 
     if finish_task:
-        scheduler.remove_job(job_id = index_of_pipeline)
+        # задача звонков дождётся доставки итоговых статусов агенту, прежде чем завершиться
+        tracked["delivered"] = delivered
+        stop_tracking(index_of_pipeline)
         print(f"Задача {index_of_pipeline} завершена и удалена из scheduler")
+
+
+def stop_tracking(index_of_pipeline: str):
+    tracked = call_statuses.pop(index_of_pipeline, None)
+    if tracked is not None:
+        tracked["done"].set()
+    try:
+        app.state.scheduler.remove_job(job_id = index_of_pipeline)
+    except JobLookupError:
+        pass
+
+
+async def check_status(index_of_task: int, index_of_pipeline: str, index_of_component: int, scheduler: AsyncIOScheduler):
+    # Сверка: статусы приходят push-уведомлениями, опрос только догоняет потерянные переходы
+    response = await app.state.client_voice_bot.post(
+    f"/check_status?index={index_of_task}"
+)
+    statuses_json = loads(response.content)
+    tracked = call_statuses.get(index_of_pipeline)
+    if tracked is None:
+        return
+    if not statuses_json:
+        # Voice Bot не знает этих звонков: кандидатов не было или он перезапускался и потерял их -
+        # статусов уже не будет, задача заканчивается, а не ждёт вечно
+        tracked["lost"] = tracked["expected"] > 0
+        stop_tracking(index_of_pipeline)
+        return
+    if tracked["statuses"] is None:
+        # первый снимок: все кандидаты уходят как изменения от пустого состояния
+        tracked.update(statuses=[None] * len(statuses_json), versions=[0] * len(statuses_json))
+    apply_call_statuses(index_of_pipeline, dict(enumerate(statuses_json)))
+
+
+@app.post("/voice_bot/call_status")
+async def voice_bot_call_status(update: dict):
+    """Callback of the Voice Bot: the new state of one call."""
+    index_of_pipeline = str(update["index"])
+    tracked = call_statuses.get(index_of_pipeline)
+    # до первой сверки список ещё не получен - переход увидим в нём же
+    if tracked is None or tracked["statuses"] is None:
+        return {"status": "ignored"}
+    apply_call_statuses(index_of_pipeline, {update["position"]: update["status"]})
+    return {"status": "ok"}
     
 
 
-async def task_for_voice_bot(parameters: dict, scheduler: AsyncIOScheduler):
-    async with websockets.connect(url.url_agent_websocket) as ws:
-
-        
-        result = await app.state.client_voice_bot.post("/call_webhook", params={"index":parameters["index_of_pipeline"] }, json= parameters["candidates"]["candidates"])
-
-        if result.json()["status"] == "started":
-
-            payload = {
-                "user_id": "0",
-                "session_id": "0",
-                "index_of_pipeline": parameters["index_of_pipeline"],
-                "index_of_component": parameters["index_of_component"],
-                "type_of_component": "voice_bot_component",
-                "finish_task": None,
-                "status_about_each_candidate": None,
-                "state_changes": {"NOT_STARTED": False, "RUNNING": True}
-            }
-
-            await ws.send(json.dumps(payload))
-            response = await ws.recv()
-            print(f"Ответ: {response}")
-
-            try:
-                async with httpx.AsyncClient() as client:
-                    await client.post(
-                        "http://localhost:8765/update_pipeline_status",
-                        json={
-                            "index_of_pipeline": parameters["index_of_pipeline"],
-                            "index_of_component": parameters["index_of_component"],
-                            "state_changes": {"NOT_STARTED": False, "RUNNING": True}
-                        }
-                    )
-            except Exception as e:
-                print(f"Failed to update Streamlit: {e}")
-
-            scheduler.add_job(
-                check_status,
-                'interval',
-                seconds=3,
-                args=[
-                    int(parameters["index_of_pipeline"]),  
-                    parameters["index_of_pipeline"],  
-                    parameters["index_of_component"],
-                    scheduler,
-                
-                ],
-                id=parameters["index_of_pipeline"]
-            )
-            print(f"Задача для проверки статуса {parameters['index_of_pipeline']} добавлена в scheduler")
+async def task_for_voice_bot(parameters: dict, checkpoint: dict = None, save=skip_checkpoint):
+    # Задача живёт, пока идут звонки: так журнал знает, что после перезапуска их надо снова отслеживать
+    index_of_pipeline = parameters["index_of_pipeline"]
+    scheduler = app.state.scheduler
+    done = asyncio.Event()
+    candidates = parameters["candidates"]["candidates"]
+    tracked = {"index_of_component": parameters["index_of_component"], "statuses": None, "versions": None,
+               "seq": 0, "done": done, "expected": len(candidates), "lost": False, "delivered": None}
+    call_statuses[index_of_pipeline] = tracked
+
+    checkpoint = checkpoint or {}
+    if checkpoint.get("started"):
+        # звонки уже идут в Voice Bot - не звоним повторно, только снова следим за статусами
+        print(f"♻️ Calls of pipeline {index_of_pipeline} are already running, tracking their statuses again")
+    else:
+        # id запуска сохраняется до вызова: если Task Manager упадёт между вызовом и сохранением,
+        # повторный /call_webhook с тем же id Voice Bot проигнорирует, а не позвонит всем снова
+        call_id = checkpoint.get("call_id") or uuid.uuid4().hex
+        await save({"call_id": call_id, "started": False})
+        result = await app.state.client_voice_bot.post("/call_webhook",
+                                                       params={"index": index_of_pipeline, "call_id": call_id,
+                                                               "callback_url": f"{url.url_task_manager}/voice_bot/call_status"},
+                                                       **json_body(candidates))
+        if loads(result.content)["status"] != "started":
+            call_statuses.pop(index_of_pipeline, None)
+            return
+        await save({"call_id": call_id, "started": True})
+
+        app.state.events.publish(PipelineEvent(
+            index_of_pipeline=parameters["index_of_pipeline"],
+            index_of_component=parameters["index_of_component"],
+            type_of_component="voice_bot_component",
+            state_changes={"NOT_STARTED": False, "RUNNING": True}))
+
+    args = [
+        int(parameters["index_of_pipeline"]),  
+        parameters["index_of_pipeline"],  
+        parameters["index_of_component"],
+        scheduler,
+    ]
+    # первый снимок статусов сразу, дальше - переходы от Voice Bot и редкая сверка
+    await check_status(*args)
+    if index_of_pipeline in call_statuses:
+        scheduler.add_job(
+            check_status,
+            'interval',
+            seconds=VOICE_BOT_RECONCILE_SECONDS,
+            args=args,
+            id=parameters["index_of_pipeline"],
+            replace_existing=True
+        )
+        print(f"Задача для проверки статуса {parameters['index_of_pipeline']} добавлена в scheduler")
+    await done.wait()
+    if tracked["lost"]:
+        raise RuntimeError(f"Voice Bot has no calls of pipeline {index_of_pipeline}, they were lost on its restart")
+    if tracked["delivered"] is not None:
+        # после падения до доставки задача продолжится: сверка снова получит итоговые статусы и опубликует их
+        await tracked["delivered"]
 
 @app.post("/kill_voice_bot_task") 
 async def kill_voice_bot_task(index_of_pipeline : str, index_of_component: int):
     
     result = await app.state.client_voice_bot.post("/kill_task", params={"index": int(index_of_pipeline)})
-    print(f"🛑 Voice Bot task killed: {result.json()['status']}")
+    print(f"🛑 Voice Bot task killed: {loads(result.content)['status']}")
 
     try:
         app.state.scheduler.remove_job(index_of_pipeline)
         print(f"✅ Removed job {index_of_pipeline} from scheduler")
     except Exception as e:
         print(f"⚠️ Job {index_of_pipeline} not found in scheduler: {e}")
+    call_statuses.pop(index_of_pipeline, None)
+    journal = app.state.tasks.journal
+    for task in await journal.call(partial(journal.find, state="running", index_of_pipeline=index_of_pipeline,
+                                           type_of_component="Voice_bot")):
+        await app.state.tasks.cancel(task["id"])
+
+    app.state.events.publish(PipelineEvent(
+        index_of_pipeline=index_of_pipeline,
+        index_of_component=index_of_component,
+        type_of_component="voice_bot_component",
+        state_changes={"INTERRUPTED": True, "RUNNING": False, "COMPLETED": False},
+        finish_task=True))
 
-    ws = await websockets.connect(url.url_agent_websocket)
-
-    payload = {
-                "user_id": "0",
-                "session_id": "0",
-                "index_of_pipeline": index_of_pipeline,
-                "index_of_component": index_of_component,
-                "type_of_component": "voice_bot_component",
-                "finish_task": True,
-                "status_about_each_candidate": [],
-                "state_changes": {"INTERRUPTED": True, "RUNNING": False, "COMPLETED" : False}
-            }
-    
-    await ws.send(json.dumps(payload))
-    response = await ws.recv()
-    print(f"📥 Agent response: {response}")
-    await ws.close()
-
-    
-    try:
-        async with httpx.AsyncClient() as client:
-            await client.post(
-                "http://localhost:8765/update_pipeline_status",
-                json={
-                    "index_of_pipeline": index_of_pipeline,
-                    "index_of_component": index_of_component,
-                    "state_changes": {"INTERRUPTED": True, "RUNNING": False, "COMPLETED": False}
-                }
-            )
-            print(f"✅ Sent INTERRUPTED status to Streamlit for pipeline #{index_of_pipeline}")
-    except Exception as e:
-        print(f"⚠️ Failed to update Streamlit: {e}")
-    
-    
     return {"status": "cancelled", "pipeline": index_of_pipeline} 
 
 
@@ -317,6 +417,27 @@ async def kill_voice_bot_task(index_of_pipeline : str, index_of_component: int):
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/connections/stats")
+async def connections_stats():
+    return {"agent": app.state.agent.stats()}
+
+@app.get("/events/stats")
+async def events_stats():
+    return app.state.events.stats()
+
+@app.get("/tasks")
+async def list_tasks(state: str = None, index_of_pipeline: str = None, limit: int = 100):
+    journal = app.state.tasks.journal
+    return await journal.call(partial(journal.find, state=state, index_of_pipeline=index_of_pipeline, limit=limit))
+
+@app.get("/tasks/{task_id}")
+async def get_task(task_id: str):
+    task = await app.state.tasks.journal.call(app.state.tasks.journal.get, task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    task["in_memory"] = task_id in app.state.tasks.tasks
+    return task
+
 @app.post("/create_tasks")
 async def create_tasks(type_of_component: str, index_of_pipeline : str, index_of_component: int, data: dict):
 
@@ -340,17 +461,18 @@ async def create_tasks(type_of_component: str, index_of_pipeline : str, index_of
             return {"error": "number_of_resumes is required for ATS component"}
     
         dictionary_for_arguments["number_of_resumes"] = number_of_resumes
-        app.state.loop.create_task(task_for_adding_people_to_ai_matching(dictionary_for_arguments))
+        # необязательные фильтры ATS: skills, languages, location, headline, revision_date_from/to
+        dictionary_for_arguments["filters"] = data.get("filters")
+        return {"status": "ok", "task_id": await app.state.tasks.submit("ATS", dictionary_for_arguments)}
 
     if type_of_component == "AI_Matching":
         dictionary_for_arguments["resume"] = data["resume"]
         dictionary_for_arguments["number_of_candidates"] = data["number_of_candidates"]
-        app.state.loop.create_task(task_for_ai_matching(dictionary_for_arguments))
+        return {"status": "ok", "task_id": await app.state.tasks.submit("AI_Matching", dictionary_for_arguments)}
 
     if type_of_component == "Voice_bot":
         dictionary_for_arguments["candidates"] = data["candidates"]
-        app.state.loop.create_task(task_for_voice_bot(dictionary_for_arguments, scheduler= app.state.scheduler))
-        return {"status": "ok"}
+        return {"status": "ok", "task_id": await app.state.tasks.submit("Voice_bot", dictionary_for_arguments)}
 
 
 if __name__ == "__main__":
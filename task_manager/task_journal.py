@@ -0,0 +1,187 @@
+import asyncio
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Optional
+from models.codec import dumps_str, loads
+
+class TaskJournal:
+    """Task Manager tasks persisted in SQLite (WAL): parameters, state, attempts and the last checkpoint.
+
+    A task is `running` until it ends as `completed`, `failed` or `cancelled`; a task left
+    `running` by a stopped Task Manager is continued on the next start.
+
+    A checkpoint is whatever the task needs to continue without repeating finished work
+    (an ATS cursor, an AI Matching search id and offset); it is overwritten on every save.
+
+    The methods are blocking; asyncio callers go through `call()`, which runs them one by
+    one in the journal's own thread, so the event loop never waits for a locked database
+    and checkpoints are written in the order they were saved.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                type_of_component TEXT NOT NULL,
+                index_of_pipeline TEXT NOT NULL,
+                index_of_component INTEGER NOT NULL,
+                parameters TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                checkpoint TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state)")
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-journal")
+
+    def call(self, method, *args) -> asyncio.Future:
+        """Queues `method(*args)` for the journal thread; the returned future resolves with its result."""
+        return asyncio.wrap_future(self.executor.submit(method, *args))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def create(self, type_of_component: str, parameters: dict) -> str:
+        task_id = uuid.uuid4().hex
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO tasks (id, type_of_component, index_of_pipeline, index_of_component, parameters, state, "
+            "created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'running', ?, ?)",
+            (task_id, type_of_component, str(parameters["index_of_pipeline"]), parameters["index_of_component"],
+             dumps_str(parameters), now, now))
+        return task_id
+
+    def started(self, task_id: str):
+        self.conn.execute("UPDATE tasks SET attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                          (time.time(), task_id))
+
+    def save_checkpoint(self, task_id: str, checkpoint: dict):
+        self.conn.execute("UPDATE tasks SET checkpoint = ?, updated_at = ? WHERE id = ?",
+                          (dumps_str(checkpoint), time.time(), task_id))
+
+    def finish(self, task_id: str, state: str, error: Optional[str] = None):
+        self.conn.execute("UPDATE tasks SET state = ?, error = ?, updated_at = ? WHERE id = ? AND state = 'running'",
+                          (state, error, time.time(), task_id))
+
+    @staticmethod
+    def row_to_task(row) -> dict:
+        (task_id, type_of_component, index_of_pipeline, index_of_component, parameters, state, attempts,
+         checkpoint, error, created_at, updated_at) = row
+        return {"id": task_id, "type_of_component": type_of_component, "index_of_pipeline": index_of_pipeline,
+                "index_of_component": index_of_component, "parameters": loads(parameters), "state": state,
+                "attempts": attempts, "checkpoint": loads(checkpoint) if checkpoint else None, "error": error,
+                "created_at": created_at, "updated_at": updated_at}
+
+    def get(self, task_id: str) -> Optional[dict]:
+        row = self.conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return self.row_to_task(row) if row else None
+
+    def find(self, state: Optional[str] = None, index_of_pipeline: Optional[str] = None,
+             type_of_component: Optional[str] = None, limit: int = 100) -> list[dict]:
+        query, args = "SELECT * FROM tasks WHERE 1 = 1", []
+        for column, value in (("state", state), ("index_of_pipeline", index_of_pipeline),
+                              ("type_of_component", type_of_component)):
+            if value is not None:
+                query += f" AND {column} = ?"
+                args.append(str(value))
+        query += " ORDER BY created_at DESC LIMIT ?"
+        args.append(limit)
+        return [self.row_to_task(row) for row in self.conn.execute(query, args)]
+
+    def unfinished(self) -> list[dict]:
+        return [self.row_to_task(row) for row in
+                self.conn.execute("SELECT * FROM tasks WHERE state = 'running' ORDER BY created_at")]
+
+
+# save(checkpoint) ставит запись в очередь сразу и возвращает future, который завершается, когда она в журнале
+Save = Callable[[dict], Awaitable[None]]
+# runner(parameters, checkpoint, save): checkpoint - сохранённое прошлым запуском или None
+Runner = Callable[[dict, Optional[dict], Save], Awaitable[None]]
+
+
+def skip_checkpoint(checkpoint: dict) -> asyncio.Future:
+    """`save` for a task that runs without a journal."""
+    done = asyncio.get_running_loop().create_future()
+    done.set_result(None)
+    return done
+
+
+class TaskSupervisor:
+    """Runs journaled tasks and keeps a reference to each of them until it ends.
+
+    On startup `resume()` starts every task the journal still has as running, passing its
+    last checkpoint. A task interrupted by shutdown stays running in the journal, so
+    it is picked up by the next start.
+    """
+
+    def __init__(self, journal: TaskJournal, runners: Dict[str, Runner]):
+        self.journal = journal
+        self.runners = runners
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.cancelled = set()
+
+    async def submit(self, type_of_component: str, parameters: dict) -> str:
+        task_id = await self.journal.call(self.journal.create, type_of_component, parameters)
+        self.start(task_id, type_of_component, parameters, None)
+        return task_id
+
+    def start(self, task_id: str, type_of_component: str, parameters: dict, checkpoint: Optional[dict]):
+        task = asyncio.get_running_loop().create_task(self.run(task_id, type_of_component, parameters, checkpoint))
+        self.tasks[task_id] = task
+        task.add_done_callback(lambda _: self.tasks.pop(task_id, None))
+
+    async def resume(self) -> int:
+        unfinished = await self.journal.call(self.journal.unfinished)
+        for task in unfinished:
+            print(f"♻️ Resuming task {task['id']} ({task['type_of_component']}, pipeline {task['index_of_pipeline']}) "
+                  f"from checkpoint {task['checkpoint']}")
+            self.start(task["id"], task["type_of_component"], task["parameters"], task["checkpoint"])
+        return len(unfinished)
+
+    async def run(self, task_id: str, type_of_component: str, parameters: dict, checkpoint: Optional[dict]):
+        await self.journal.call(self.journal.started, task_id)
+        try:
+            await self.runners[type_of_component](parameters, checkpoint,
+                                                  lambda checkpoint: self.journal.call(self.journal.save_checkpoint,
+                                                                                       task_id, checkpoint))
+        except asyncio.CancelledError:
+            if task_id in self.cancelled:
+                await self.journal.call(self.journal.finish, task_id, "cancelled")
+            # при остановке Task Manager задача остаётся running и продолжится после перезапуска
+            raise
+        except Exception as e:
+            print(f"⚠️ Task {task_id} ({type_of_component}) failed: {e!r}")
+            await self.journal.call(self.journal.finish, task_id, "failed", repr(e))
+        else:
+            await self.journal.call(self.journal.finish, task_id, "completed")
+        finally:
+            self.cancelled.discard(task_id)
+
+    async def cancel(self, task_id: str) -> bool:
+        task = self.tasks.get(task_id)
+        if task is None:
+            await self.journal.call(self.journal.finish, task_id, "cancelled")
+            return False
+        self.cancelled.add(task_id)
+        task.cancel()
+        return True
+
+    async def close(self):
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # дожидаемся записей, уже стоящих в очереди журнала
+        await asyncio.to_thread(self.journal.close)
+
+    def stats(self) -> dict:
+        return {"running": len(self.tasks)}
@@ -1,4 +1,7 @@
 url_ats = "http://0.0.0.0:8080"
 url_ai_matching = "http://0.0.0.0:8001"
 url_agent_websocket = "ws://0.0.0.0:9999/ws/update_session_state"
-url_voice_bot = "http://127.0.0.1:8002"
\ No newline at end of file
+url_voice_bot = "http://127.0.0.1:8002"
+url_dashboard = "http://localhost:8765"
+
+url_task_manager = "http://127.0.0.1:7999"